@@ -0,0 +1,308 @@
+"""Lokale stand-ins for Nexus, XFlow og automation-serverens workqueue.
+
+Alle kald simulerer netværkslatens og kan fejle med en given sandsynlighed,
+så scheduling, caching og samtidighed kan sammenlignes uden adgang til
+produktionsmiljøerne.
+"""
+
+import base64
+import itertools
+import os
+import random
+import threading
+import time
+
+from dataclasses import dataclass
+
+import httpx
+
+
+@dataclass
+class Profil:
+    """Latens i millisekunder, fejlrate og dokumentstørrelser for fakes."""
+
+    latens_ms: float = 50
+    spredning_ms: float = 20
+    fejlrate: float = 0.0
+    pdf_kb: int = 200
+    dokument_kb: int = 500
+    side_størrelse: int = 50
+    seed: int = 0
+
+
+class Backend:
+    def __init__(self, navn: str, profil: Profil):
+        self.navn = navn
+        self.profil = profil
+        self._rng = random.Random(profil.seed)
+        self._lås = threading.Lock()
+
+    def kald(self, metode: str):
+        with self._lås:
+            ventetid = max(
+                0.0, self._rng.gauss(self.profil.latens_ms, self.profil.spredning_ms)
+            )
+            fejler = self._rng.random() < self.profil.fejlrate
+
+        time.sleep(ventetid / 1000)
+
+        if fejler:
+            request = httpx.Request("POST", f"https://{self.navn}.invalid/{metode}")
+            raise httpx.HTTPStatusError(
+                f"Simuleret fejl i {self.navn}.{metode}",
+                request=request,
+                response=httpx.Response(503, request=request),
+            )
+
+
+class _FakeBorgere:
+    def __init__(self, backend: Backend, nexus: "FakeNexusClientManager"):
+        self._backend = backend
+        self._nexus = nexus
+
+    def hent_borger(self, cpr: str) -> dict | None:
+        self._backend.kald("hent_borger")
+        return self._nexus.borgere_data.get(cpr)
+
+    def opret_borger(self, borger_cpr: str) -> dict:
+        self._backend.kald("opret_borger")
+        borger = {
+            "id": next(self._nexus.id_tæller),
+            "patientIdentifier": {"identifier": borger_cpr},
+            "patientStatus": "ACTIVE",
+        }
+        self._nexus.borgere_data[borger_cpr] = borger
+        return borger
+
+    def aktiver_borger_fra_kladde(self, borger: dict) -> dict:
+        self._backend.kald("aktiver_borger_fra_kladde")
+        return {**borger, "patientStatus": "ACTIVE"}
+
+    def hent_visning(self, borger: dict) -> dict:
+        self._backend.kald("hent_visning")
+        return {"borger_id": borger["id"]}
+
+    def hent_referencer(self, visning: dict) -> list[dict]:
+        self._backend.kald("hent_referencer")
+        forløb = self._nexus.forløb_data.get(visning["borger_id"], [])
+        return [
+            {
+                "name": "Ældre og sundhedsfagligt grundforløb",
+                "type": "patientPathwayReference",
+                "children": [
+                    {
+                        "name": f["name"],
+                        "type": "patientPathwayReference",
+                        "id": f["id"],
+                        "children": [],
+                    }
+                    for f in forløb
+                ],
+            }
+        ]
+
+
+class _FakeOrganisationer:
+    def __init__(self, backend: Backend):
+        self._backend = backend
+
+    def hent_organisation_ved_navn(self, navn: str) -> dict:
+        self._backend.kald("hent_organisation_ved_navn")
+        return {"id": abs(hash(navn)) % 10000, "name": navn}
+
+    def tilføj_borger_til_organisation(self, borger: dict, organisation: dict):
+        self._backend.kald("tilføj_borger_til_organisation")
+
+
+class _FakeForløb:
+    def __init__(self, backend: Backend, nexus: "FakeNexusClientManager"):
+        self._backend = backend
+        self._nexus = nexus
+
+    def opret_forløb(self, borger: dict, grundforløb_navn: str, forløb_navn: str):
+        self._backend.kald("opret_forløb")
+        forløb = self._nexus.forløb_data.setdefault(borger["id"], [])
+        if not any(f["name"] == forløb_navn for f in forløb):
+            forløb.append({"id": next(self._nexus.id_tæller), "name": forløb_navn})
+
+    def opret_dokument(self, borger: dict, forløb: dict, fil, filnavn: str, **kwargs):
+        if hasattr(fil, "read"):
+            while fil.read(64 * 1024):
+                pass
+        self._backend.kald("opret_dokument")
+        self._nexus.dokumenter += 1
+
+
+class _FakeSkemaer:
+    def __init__(self, backend: Backend):
+        self._backend = backend
+        self._id = itertools.count(1)
+
+    def opret_komplet_skema(self, borger: dict, skematype_navn: str, **kwargs) -> dict:
+        self._backend.kald("opret_komplet_skema")
+        return {"id": next(self._id), "type": skematype_navn}
+
+
+class _FakeOpgaver:
+    def __init__(self, backend: Backend):
+        self._backend = backend
+
+    def opret_opgave(self, objekt: dict, opgave_type: str, **kwargs):
+        self._backend.kald("opret_opgave")
+        return {"objekt": objekt["id"], "type": opgave_type}
+
+
+class FakeNexusClientManager:
+    def __init__(self, profil: Profil):
+        backend = Backend("nexus", profil)
+        self.id_tæller = itertools.count(1)
+        self.borgere_data: dict[str, dict] = {}
+        self.forløb_data: dict[int, list[dict]] = {}
+        self.dokumenter = 0
+
+        self.borgere = _FakeBorgere(backend, self)
+        self.organisationer = _FakeOrganisationer(backend)
+        self.forløb = _FakeForløb(backend, self)
+        self.skemaer = _FakeSkemaer(backend)
+        self.opgaver = _FakeOpgaver(backend)
+        self._backend = backend
+
+    def hent_fra_reference(self, reference: dict) -> dict:
+        self._backend.kald("hent_fra_reference")
+        return {"id": reference["id"], "name": reference["name"]}
+
+
+class FakeXFlowClient:
+    def is_non_empty(self, value) -> bool:
+        return value is not None and value != ""
+
+
+class FakeProcessClient:
+    def __init__(self, profil: Profil, arbejdsgange: list[dict]):
+        self._backend = Backend("xflow", profil)
+        self._profil = profil
+        self._arbejdsgange = arbejdsgange
+        self.opdateret: set[str] = set()
+        self.avanceret: set[str] = set()
+
+    def search_processes(self, query: dict) -> list[dict]:
+        self._backend.kald("search_processes")
+        start = query.get("startIndex", 0)
+        return [
+            {
+                **a,
+                "currentActivityName": (
+                    "Afsluttet" if a["publicId"] in self.avanceret else "RPAIntegration"
+                ),
+            }
+            for a in self._arbejdsgange[start : start + self._profil.side_størrelse]
+        ]
+
+    def create_process_pdf(self, process_id: str) -> bytes:
+        self._backend.kald("create_process_pdf")
+        return os.urandom(self._profil.pdf_kb * 1024)
+
+    def update_process(self, process_id: str, data: dict):
+        self._backend.kald("update_process")
+        self.opdateret.add(process_id)
+
+    def advance_process(self, process_id: str):
+        self._backend.kald("advance_process")
+        self.avanceret.add(process_id)
+
+
+class FakeDocumentClient:
+    def __init__(self, profil: Profil):
+        self._backend = Backend("xflow", profil)
+        self._profil = profil
+
+    def hent_dokument_med_metadata(self, dokument_id: str) -> dict:
+        self._backend.kald("hent_dokument_med_metadata")
+        return {
+            "byteArray": base64.b64encode(
+                os.urandom(self._profil.dokument_kb * 1024)
+            ).decode("ascii"),
+            "filename": f"{dokument_id}.pdf",
+            "contentType": "application/pdf",
+        }
+
+
+class FakeWorkItem:
+    def __init__(self, id: int, data: dict, reference: str):
+        self.id = id
+        self.data = data
+        self.reference = reference
+        self.status = "new"
+        self.message = ""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.fail(str(exc_value))
+        elif self.status == "in progress":
+            self.complete()
+        return False
+
+    def update(self, data: dict):
+        self.data = dict(data)
+
+    def complete(self, message: str = ""):
+        self.status = "completed"
+        self.message = message
+
+    def fail(self, message: str = ""):
+        self.status = "failed"
+        self.message = message
+
+
+class FakeWorkqueue:
+    """In-memory workqueue med samme interface som automation-serverens Workqueue."""
+
+    def __init__(self, latens_ms: float = 5):
+        self.latens_ms = latens_ms
+        self.items: list[FakeWorkItem] = []
+        self._lås = threading.Lock()
+        self._id = itertools.count(1)
+
+    def _kald(self):
+        time.sleep(self.latens_ms / 1000)
+
+    def add_item(self, data: dict, reference: str) -> FakeWorkItem:
+        self._kald()
+        item = FakeWorkItem(next(self._id), data, reference)
+        with self._lås:
+            self.items.append(item)
+        return item
+
+    def get_item_by_reference(self, reference: str, status=None) -> list[FakeWorkItem]:
+        self._kald()
+        with self._lås:
+            return [
+                i
+                for i in self.items
+                if i.reference == reference and (status is None or i.status == status)
+            ]
+
+    def clear_workqueue(self, workitem_status=None, days_older_than=None):
+        with self._lås:
+            self.items = [i for i in self.items if i.status != "new"]
+
+    def get_next_item(self) -> FakeWorkItem | None:
+        self._kald()
+        with self._lås:
+            for item in self.items:
+                if item.status == "new":
+                    item.status = "in progress"
+                    return item
+        return None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> FakeWorkItem:
+        item = self.get_next_item()
+        if item is None:
+            raise StopIteration
+        return item
@@ -0,0 +1,129 @@
+import random
+
+from process.xflow_service import PERSONOPLYSNINGER, SAMLET_ANSØGNING
+
+HJÆLPEMIDLER = [
+    "Ortopædisk fodindlæg - Højre fod",
+    "Diabeteshjælpemiddel - Injektionsbehandling",
+    "Kontinenshjælpemiddel - Bleer",
+    "Stomihjælpemiddel",
+    "Protese - Bryst",
+    "Kompressionsstrømper og støttestrømper - Begge ben",
+    "Paryk",
+    "Andet",
+]
+
+
+def generer_cpr(rng: random.Random) -> str:
+    dato = f"{rng.randint(1, 28):02d}{rng.randint(1, 12):02d}{rng.randint(30, 99):02d}"
+    return f"{dato}-{rng.randint(0, 9999):04d}"
+
+
+def generer_arbejdsgang(
+    public_id: str,
+    cpr: str,
+    hjælpemiddel: str,
+    dokument_ids: list[str],
+    genansøgning: bool = False,
+    fyld_elementer: int = 40,
+) -> dict:
+    """Arbejdsgang i samme form, som XFlow-søgningen returnerer."""
+    halvdel = len(dokument_ids) // 2
+    fyld = [
+        {"identifier": f"Felt{i}", "values": {"Tekst": "x" * 20}}
+        for i in range(fyld_elementer)
+    ]
+
+    return {
+        "publicId": public_id,
+        "blanketter": [
+            {
+                "blanketnavn": SAMLET_ANSØGNING,
+                "elementer": [
+                    *fyld,
+                    {
+                        "identifier": "ElementVaerdilisteTypeHjaelpemiddel",
+                        "values": {"Valgtetekst": hjælpemiddel},
+                    },
+                    {
+                        "identifier": "HarDuTidligereSoegt",
+                        "values": {"YesSelected": str(genansøgning)},
+                    },
+                    {
+                        "identifier": "BemærkningerOgVedhaeftFiler",
+                        "children": [
+                            [
+                                {
+                                    "identifier": "UploadBilag",
+                                    "values": {
+                                        f"document{i + 1}": dokument_id
+                                        for i, dokument_id in enumerate(
+                                            dokument_ids[:halvdel]
+                                        )
+                                    },
+                                }
+                            ]
+                        ],
+                    },
+                ],
+            },
+            {
+                "blanketnavn": PERSONOPLYSNINGER,
+                "elementer": [
+                    *fyld,
+                    {
+                        "identifier": "PersonoplysningerAnsoegerSelv",
+                        "values": {"CprNummer": cpr},
+                    },
+                    {
+                        "identifier": "Dokumentation",
+                        "children": [
+                            [
+                                {
+                                    "identifier": "UploadDokumentationVaerge",
+                                    "values": {
+                                        f"document{i + 1}": dokument_id
+                                        for i, dokument_id in enumerate(
+                                            dokument_ids[halvdel:]
+                                        )
+                                    },
+                                }
+                            ]
+                        ],
+                    },
+                ],
+            },
+        ],
+    }
+
+
+def generer_arbejdsgange(
+    antal: int,
+    dokumenter_pr_ansøgning: int,
+    andel_gentagne_borgere: float = 0.1,
+    seed: int = 0,
+) -> list[dict]:
+    rng = random.Random(seed)
+    borgere: list[str] = []
+    arbejdsgange = []
+
+    for i in range(antal):
+        if borgere and rng.random() < andel_gentagne_borgere:
+            cpr = rng.choice(borgere)
+        else:
+            cpr = generer_cpr(rng)
+            borgere.append(cpr)
+
+        arbejdsgange.append(
+            generer_arbejdsgang(
+                public_id=f"{100000 + i}",
+                cpr=cpr,
+                hjælpemiddel=rng.choice(HJÆLPEMIDLER),
+                dokument_ids=[
+                    f"{100000 + i}-{d}" for d in range(dokumenter_pr_ansøgning)
+                ],
+                genansøgning=rng.random() < 0.3,
+            )
+        )
+
+    return arbejdsgange
@@ -0,0 +1,192 @@
+"""Offline benchmark af populate_queue og process_workqueue.
+
+Kører hele processen mod de lokale stand-ins i `benchmark.fakes`, så ændringer
+i scheduling, caching og samtidighed kan sammenlignes uden credentials:
+
+    python -m benchmark.run --items 200 --workers 4 --latency-ms 80
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+
+import main
+
+from benchmark.fakes import (
+    FakeDocumentClient,
+    FakeNexusClientManager,
+    FakeProcessClient,
+    FakeWorkqueue,
+    FakeXFlowClient,
+    Profil,
+)
+from benchmark.fixtures import generer_arbejdsgange
+from process.config import load_excel_mapping
+from process.metrics import metrics
+from process.container import Tjenester
+from process.prefetch import Forudhenter
+from process.queue_cursor import QueueCursor
+from process.ratelimit import BegrænsetKlient
+from process.tracking import HukommelsesTracker
+
+
+def opsæt(profil: Profil, arbejdsgange: list[dict], mappe: str) -> FakeWorkqueue:
+    """Sætter main's tjenester op mod fakes. Services bygges af containeren som i drift."""
+    main.logger = logging.getLogger("benchmark")
+
+    tjenester = Tjenester(mappe, main.nexus_begrænser, main.xflow_begrænser)
+    tjenester.workqueue = FakeWorkqueue(latens_ms=profil.latens_ms / 10)
+    tjenester.xflow_client = FakeXFlowClient()
+    tjenester.nexus = BegrænsetKlient(
+        metrics.instrumenter(FakeNexusClientManager(profil), "nexus"),
+        main.nexus_begrænser,
+    )
+    tjenester.xflow_process_client = BegrænsetKlient(
+        metrics.instrumenter(FakeProcessClient(profil, arbejdsgange), "xflow.process"),
+        main.xflow_begrænser,
+    )
+    tjenester.xflow_document_client = BegrænsetKlient(
+        metrics.instrumenter(FakeDocumentClient(profil), "xflow.document"),
+        main.xflow_begrænser,
+    )
+    tjenester.tracker = HukommelsesTracker()
+    main.tjenester = tjenester
+
+    return tjenester.workqueue
+
+
+def kør(args: argparse.Namespace) -> dict:
+    profil = Profil(
+        latens_ms=args.latency_ms,
+        spredning_ms=args.latency_ms * 0.4,
+        fejlrate=args.error_rate,
+        pdf_kb=args.pdf_kb,
+        dokument_kb=args.attachment_kb,
+        seed=args.seed,
+    )
+    arbejdsgange = generer_arbejdsgange(
+        args.items,
+        dokumenter_pr_ansøgning=args.attachments,
+        andel_gentagne_borgere=args.repeat_citizens,
+        seed=args.seed,
+    )
+    main.nexus_begrænser.sæt_rate(args.nexus_rate)
+    main.xflow_begrænser.sæt_rate(args.xflow_rate)
+    load_excel_mapping(args.excel_file)
+
+    with tempfile.TemporaryDirectory() as mappe:
+        workqueue = opsæt(profil, arbejdsgange, mappe)
+        cursor = QueueCursor(
+            os.path.join(mappe, "queue_cursor.json"), main.proces_skabelon_id
+        )
+
+        tracemalloc.start()
+
+        start = time.perf_counter()
+        asyncio.run(main.populate_queue(workqueue, cursor))
+        opfyldning = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if args.prefetch > 0:
+            main.tjenester.nexus_service.forudhenter = Forudhenter()
+
+        behandlet = asyncio.run(
+            main.process_workqueue(
+                workqueue,
+                workers=args.workers,
+                forudhent=args.prefetch,
+                grupper=args.group_by_cpr,
+            )
+        )
+        behandling = time.perf_counter() - start
+
+        start = time.perf_counter()
+        main.tjenester.xflow_outbox.behandl_afventende(alle=True)
+        tilbagemelding = time.perf_counter() - start
+
+        if main.tjenester.nexus_service.forudhenter is not None:
+            main.tjenester.nexus_service.forudhenter.stop()
+
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        status = {}
+        for item in workqueue.items:
+            status[item.status] = status.get(item.status, 0) + 1
+
+        rapport = {
+            "profil": vars(profil),
+            "workers": args.workers,
+            "forudhent": args.prefetch,
+            "grupper": args.group_by_cpr,
+            "arbejdsgange": len(arbejdsgange),
+            "behandlet": behandlet,
+            "status": status,
+            "outbox": main.tjenester.xflow_outbox.rapport()["antal"],
+            "opfyldning_s": round(opfyldning, 2),
+            "behandling_s": round(behandling, 2),
+            "tilbagemelding_s": round(tilbagemelding, 2),
+            "items_pr_minut": round(behandlet / behandling * 60, 1)
+            if behandling > 0
+            else 0.0,
+            "peak_python_mb": round(peak / 1024 / 1024, 1),
+            "maxrss_mb": round(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+            ),
+            "trin": metrics.opsummering(),
+            "tællere": metrics.tællere(),
+        }
+
+    metrics.nulstil()
+    return rapport
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+
+    parser = argparse.ArgumentParser(
+        description="Offline benchmark against local Nexus/XFlow stand-ins"
+    )
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--latency-ms", type=float, default=50, help="Mean latency per call"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Probability that a call fails with HTTP 503",
+    )
+    parser.add_argument("--prefetch", type=int, default=0)
+    parser.add_argument("--group-by-cpr", action="store_true")
+    parser.add_argument("--attachments", type=int, default=2)
+    parser.add_argument("--attachment-kb", type=int, default=500)
+    parser.add_argument("--pdf-kb", type=int, default=200)
+    parser.add_argument(
+        "--repeat-citizens",
+        type=float,
+        default=0.1,
+        help="Share of applications from a citizen seen earlier in the run",
+    )
+    parser.add_argument("--nexus-rate", type=float, default=1000)
+    parser.add_argument("--xflow-rate", type=float, default=1000)
+    parser.add_argument("--excel-file", default="./Regler.xlsx")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", default=None, help="Append the report as a JSON line to this file"
+    )
+    args = parser.parse_args()
+
+    rapport = kør(args)
+    print(json.dumps(rapport, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rapport, ensure_ascii=False) + "\n")
@@ -1,138 +1,410 @@
 import os
 import argparse
+import json
 import sys
 import asyncio
 import logging
+import socket
 
-from datetime import datetime, timedelta
-from automation_server_client import (
-    AutomationServer,
-    Workqueue,
-    Credential,
-    WorkItemStatus,
-)
-from kmd_nexus_client import NexusClientManager
-from xflow_client import XFlowClient, ProcessClient, DocumentClient
-from odk_tools.tracking import Tracker
-from process.nexus_service import NexusService
-from process.xflow_service import XFlowService
-from process.config import load_excel_mapping
-
-nexus: NexusClientManager
-xflow_client: XFlowClient
-xflow_process_client: ProcessClient
-xflow_document_client: DocumentClient
-xflow_service: XFlowService
-tracker: Tracker
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, time, timedelta
+from typing import Callable, Mapping
+from automation_server_client import Workqueue, WorkItemStatus
+from process.workqueue_service import WorkqueueService
+from process.queue_cursor import QueueCursor
+from process.config import Regler, RegelOvervåger, get_regler, load_excel_mapping
+from process.concurrency import CprLåse
+from process.daemon import Backoff, Stopsignal
+from process.metrics import metrics
+from process.checkpoints import Checkpoints, kør_trin
+from process.ratelimit import AdaptivBegrænser
+from process.container import Tjenester
+from process.steps import Trin, kør_graf, udelad
+from process.prefetch import Forudhenter
+from process.leases import CprLeaser
+
+tjenester: Tjenester
 proces_navn = "Opret digital ansøgning til personlige hjælpemidler"
+proces_skabelon_id = "744"
+søgevindue = timedelta(days=5)
+borger_organisation = "Team Kropsbårne hjælpemidler"
+nexus_begrænser = AdaptivBegrænser("nexus")
+xflow_begrænser = AdaptivBegrænser("xflow")
+cpr_låse = CprLåse()
+cpr_leaser: CprLeaser | None = None
+samtidige_trin = 4
+FÆLLES_TRIN = ("borger", "organisation", "forløb")
+
 
+async def populate_queue(
+    workqueue: Workqueue,
+    cursor: QueueCursor,
+    overlap: timedelta = timedelta(days=1),
+    fuld_interval: timedelta = timedelta(hours=24),
+):
+    workqueue_service = WorkqueueService(workqueue)
+    nu = datetime.today()
+
+    søg_fra, fuld = cursor.søgevindue(nu, søgevindue, overlap, fuld_interval)
+    logger.info(
+        f"Søger arbejdsgange oprettet fra {søg_fra:%d-%m-%Y}"
+        f"{' (hele søgevinduet)' if fuld else ''}"
+    )
 
-async def populate_queue(workqueue: Workqueue):
     xlow_søge_query = {
         "text": "",
-        "processTemplateIds": ["744"],
+        "processTemplateIds": [cursor.skabelon_id],
         "startIndex": 0,
-        "createdDateFrom": (datetime.today() - timedelta(days=5)).strftime("%d-%m-%Y"),
-        "createdDateTo": datetime.today().strftime("%d-%m-%Y"),
+        "createdDateFrom": søg_fra.strftime("%d-%m-%Y"),
+        "createdDateTo": nu.strftime("%d-%m-%Y"),
     }
 
-    afsluttede_arbejdsgange = xflow_process_client.search_processes_by_current_activity(
-        query=xlow_søge_query, activity_name="RPAIntegration"
+    for afsluttede_arbejdsgange in tjenester.xflow_service.søg_arbejdsgange(
+        query=xlow_søge_query, aktivitet="RPAIntegration"
+    ):
+        nye_referencer = workqueue_service.filtrer_nye_referencer(
+            [
+                f"{arbejdsgang['publicId']}"
+                for arbejdsgang in afsluttede_arbejdsgange
+                if not cursor.er_set(f"{arbejdsgang['publicId']}")
+            ]
+        )
+
+        nye_kødata = []
+        for arbejdsgang in afsluttede_arbejdsgange:
+            if f"{arbejdsgang['publicId']}" not in nye_referencer:
+                continue
+
+            kødata = tjenester.xflow_service.hent_dataudtræk_til_kødata(arbejdsgang)
+
+            if kødata is not None:
+                nye_kødata.append(kødata)
+
+        workqueue_service.tilføj_items(nye_kødata)
+
+    cursor.marker_set(workqueue_service.kendte_referencer, tidspunkt=nu)
+    # PublicIds huskes, så længe de kan dukke op i en fuld søgning.
+    cursor.gem(
+        kørt=nu,
+        glem_før=datetime.combine((nu - søgevindue).date(), time.min),
+        fuld=fuld,
     )
 
-    for arbejdsgang in afsluttede_arbejdsgange:
-        eksisterende_kødata = workqueue.get_item_by_reference(arbejdsgang["publicId"])
 
-        if len(eksisterende_kødata) > 0:
-            continue
+def item_cpr(item) -> str:
+    # Nexus-klienten importeres først her, så --queue ikke skal indlæse den.
+    from kmd_nexus_client.utils import sanitize_cpr
 
-        kødata = xflow_service.hent_dataudtræk_til_kødata(arbejdsgang)
+    return sanitize_cpr(item.data["Cpr"])
 
-        if kødata is not None:
-            workqueue.add_item(data=kødata, reference=f"{kødata['ProcesId']}")
 
+def gruppe_nøgle(item) -> str | None:
+    """CPR, items grupperes efter, eller None, hvis CPR'et er ugyldigt."""
+    try:
+        return item_cpr(item)
+    except Exception:
+        return None
 
-async def process_workqueue(workqueue: Workqueue):
-    for item in workqueue:
-        with item:
-            data = item.data
 
-            try:
-                borger = nexus_service.hent_borger(data["Cpr"])
-                nexus_service.tilføj_borger_til_organisation(
-                    borger, "Team Kropsbårne hjælpemidler"
-                )
-                sagsforløb = nexus_service.tilføj_forløb_til_borger(borger)
-                nexus_service.upload_arbejdsgang_og_vedhæftede_filer(
-                    borger, sagsforløb, data
-                )
-                nexus_service.opret_henvendelsesskema_og_opgave(
-                    borger=borger, item_data=data
-                )
+@contextmanager
+def cpr_lås(cpr: str):
+    """Holder den lokale CPR-lås og, med flere instanser, leasen på CPR'ets partition.
 
-                if data["Hjælpemiddel"].strip().lower() == "andet":
-                    xflow_service.opdater_og_avancer_arbejdsgang(
-                        item_data=data,
-                        succes=True,
-                        xflow_process_client=xflow_process_client,
-                    )
-                    tracker.track_task(proces_navn)
-                    return
-
-                nexus_service.opret_sagsnotat_og_sagsbehandling(borger, data)
-                xflow_service.opdater_og_avancer_arbejdsgang(
-                    item_data=data,
-                    succes=True,
-                    xflow_process_client=xflow_process_client,
-                )
-                tracker.track_task(proces_navn)
-            except Exception as e:
-                xflow_service.opdater_og_avancer_arbejdsgang(
-                    item_data=data,
-                    succes=False,
-                    xflow_process_client=xflow_process_client,
-                )
+    Giver en funktion, der svarer nej, hvis leasen er mistet undervejs.
+    """
+    lease = cpr_leaser.lås(cpr) if cpr_leaser is not None else nullcontext()
+    with cpr_låse.lås(cpr), lease:
+        yield lambda: cpr_leaser is None or cpr_leaser.holder(cpr)
+
+
+def item_trin(
+    data: dict, regler: Regler, checkpoints: Checkpoints | None
+) -> list[Trin]:
+    """Trin og afhængigheder for et item. Alt efter borger og forløb kan køre parallelt."""
+    trin = [
+        Trin("borger", lambda r: tjenester.nexus_service.hent_borger(data["Cpr"])),
+        Trin(
+            "organisation",
+            lambda r: kør_trin(
+                checkpoints,
+                "organisation",
+                lambda: tjenester.nexus_service.tilføj_borger_til_organisation(
+                    r["borger"], borger_organisation
+                ),
+                gem_resultat=False,
+            ),
+            afhænger_af=("borger",),
+        ),
+        Trin(
+            "forløb",
+            lambda r: kør_trin(
+                checkpoints,
+                "forløb",
+                lambda: tjenester.nexus_service.tilføj_forløb_til_borger(r["borger"]),
+            ),
+            afhænger_af=("borger",),
+        ),
+        Trin(
+            "upload",
+            lambda r: tjenester.nexus_service.upload_arbejdsgang_og_vedhæftede_filer(
+                r["borger"], r["forløb"], data, checkpoints=checkpoints
+            ),
+            afhænger_af=("borger", "forløb"),
+        ),
+        Trin(
+            "henvendelse",
+            lambda r: tjenester.nexus_service.opret_henvendelsesskema_og_opgave(
+                borger=r["borger"],
+                item_data=data,
+                regler=regler,
+                checkpoints=checkpoints,
+            ),
+            afhænger_af=("borger", "forløb"),
+        ),
+        Trin(
+            "sagsnotat",
+            lambda r: tjenester.nexus_service.opret_sagsnotat(
+                r["borger"], data, regler=regler, checkpoints=checkpoints
+            ),
+            afhænger_af=("borger", "forløb"),
+        ),
+        Trin(
+            "sagsbehandling",
+            lambda r: tjenester.nexus_service.opret_sagsbehandling(
+                r["borger"], data, regler=regler, checkpoints=checkpoints
+            ),
+            afhænger_af=("borger", "forløb"),
+        ),
+    ]
 
-                logging.warning(
-                    f"Anmodning med id: {data['ProcesId']} er fejlet og overgår til manuel behandling via mail-aflevering. Fejl: {e}"
+    return udelad(trin, regler.udeladte_trin_for(data["Hjælpemiddel"]))
+
+
+@metrics.målt("item")
+def behandl_item(item, fælles: Mapping[str, object] | None = None) -> bool:
+    """Behandler ét item. Trin med resultater i `fælles` genbruges i stedet for at køres."""
+    with item:
+        data = item.data
+        regler = get_regler()
+        checkpoints = Checkpoints(item)
+        logger.info(f"Behandler {data['ProcesId']} med regelversion {regler.version}")
+
+        try:
+            # Låsen tages inden for try, så et ugyldigt CPR fejler itemet
+            # og afleverer ansøgningen til manuel behandling som alle andre fejl.
+            with cpr_lås(item_cpr(item)) as holder_lease:
+                kør_graf(
+                    item_trin(data, regler, checkpoints),
+                    samtidige=samtidige_trin,
+                    kendte=fælles,
+                    fortsæt=holder_lease,
                 )
-                logger.error(f"Error processing item: {data}. Error: {e}")
-                item.fail(str(e))
+            tjenester.xflow_outbox.tilføj(item_data=data, succes=True)
+            tjenester.tracker.track_task(proces_navn)
+            return True
+        except Exception as e:
+            tjenester.nexus_service.glem_borger(data["Cpr"])
+            tjenester.xflow_outbox.tilføj(item_data=data, succes=False)
 
+            logging.warning(
+                f"Anmodning med id: {data['ProcesId']} er fejlet og overgår til manuel behandling via mail-aflevering. Fejl: {e}"
+            )
+            logger.error(f"Error processing item: {data}. Error: {e}")
+            item.fail(str(e))
+            return False
+        finally:
+            tjenester.nexus_service.kassér_forudhentet(data)
 
-if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO)
 
-    ats = AutomationServer.from_environment()
-    workqueue = ats.workqueue()
+def behandl_gruppe(items: list) -> None:
+    """Behandler items for samme borger efter hinanden under én CPR-lås.
 
-    nexus_credential = Credential.get_credential("KMD Nexus - produktion")
-    xflow_credential = Credential.get_credential("Xflow - produktion")
-    tracking_credential = Credential.get_credential("Odense SQL Server")
+    Ved flere ansøgninger oprettes borger, organisationstilknytning og forløb
+    én gang for hele gruppen, hvorefter hver ansøgning får sine dokumenter,
+    skemaer og opgaver og rapporteres for sig. Grupper dannes kun for gyldige
+    CPR'er, så et enkelt item med ugyldigt CPR fejles af `behandl_item`.
+    """
+    if len(items) == 1:
+        behandl_item(items[0])
+        return
 
-    nexus = NexusClientManager(
-        client_id=nexus_credential.username,
-        client_secret=nexus_credential.password,
-        instance=nexus_credential.data["instance"],
-    )
+    with cpr_lås(item_cpr(items[0])) as holder_lease:
+        fælles = None
+        try:
+            fælles = kør_graf(
+                [
+                    t
+                    for t in item_trin(items[0].data, get_regler(), None)
+                    if t.navn in FÆLLES_TRIN
+                ],
+                samtidige=samtidige_trin,
+                fortsæt=holder_lease,
+            )
+        except Exception as e:
+            # Hver ansøgning forsøger så selv og rapporterer sin egen fejl.
+            logger.warning(
+                f"Fælles opsætning for {len(items)} ansøgninger fejlede: {e}"
+            )
 
-    xflow_client = XFlowClient(
-        token=xflow_credential.password,
-        instance=xflow_credential.data["instance"],
-    )
-    xflow_process_client = ProcessClient(xflow_client)
-    xflow_document_client = DocumentClient(xflow_client)
+        gennemført = sum(behandl_item(item, fælles) for item in items)
 
-    xflow_service = XFlowService(xflow_client, xflow_process_client)
-    nexus_service = NexusService(
-        nexus,
-        xflow_process_client=xflow_process_client,
-        xflow_document_client=xflow_document_client,
+    logger.info(
+        f"{len(items)} ansøgninger for samme borger: "
+        f"{gennemført} gennemført, {len(items) - gennemført} fejlet"
     )
 
-    tracker = Tracker(
-        username=tracking_credential.username, password=tracking_credential.password
+
+async def process_workqueue(
+    workqueue: Workqueue,
+    workers: int = 1,
+    skal_stoppe: Callable[[], bool] = lambda: False,
+    forudhent: int = 0,
+    grupper: bool = False,
+) -> int:
+    # Items hentes først fra køen, når der er en ledig worker, så vi ikke
+    # reserverer flere items end vi kan behandle. Med `forudhent` reserveres
+    # yderligere op til så mange items, hvis dokumenter hentes i baggrunden.
+    # Med `grupper` behandles reserverede items for samme borger samlet.
+    # Borgere og forløb fra en tidligere runde kan være ændret i Nexus siden.
+    tjenester.nexus_service.glem_borgere()
+
+    loop = asyncio.get_running_loop()
+    pladser = asyncio.Semaphore(workers)
+    items = iter(workqueue)
+    ventende: deque = deque()
+    udtømt = False
+    igangværende: set[asyncio.Task] = set()
+    behandlet = 0
+
+    def næste():
+        # CPR'et saneres her i executoren og ikke på event-loopet.
+        item = next(items, None)
+        if item is None or not grupper:
+            return item, None
+        return item, gruppe_nøgle(item)
+
+    with ThreadPoolExecutor(max_workers=workers + 1) as executor:
+
+        async def kør(gruppe):
+            try:
+                await loop.run_in_executor(executor, behandl_gruppe, gruppe)
+            except Exception as e:
+                logger.error(f"Uventet fejl ved behandling af item: {e}")
+            finally:
+                pladser.release()
+
+        while True:
+            await pladser.acquire()
+
+            # Allerede reserverede items behandles færdigt, også ved stop.
+            while not udtømt and not skal_stoppe() and len(ventende) <= forudhent:
+                item, nøgle = await loop.run_in_executor(executor, næste)
+
+                if item is None:
+                    udtømt = True
+                    break
+
+                tjenester.nexus_service.forudhent(item.data)
+                ventende.append((item, nøgle))
+
+            if not ventende:
+                pladser.release()
+                break
+
+            item, nøgle = ventende.popleft()
+            gruppe = [item]
+            if nøgle is not None:
+                samme = [v for v in ventende if v[1] == nøgle]
+                for v in samme:
+                    ventende.remove(v)
+                gruppe += [i for i, _ in samme]
+
+            behandlet += len(gruppe)
+            opgave = asyncio.create_task(kør(gruppe))
+            igangværende.add(opgave)
+            opgave.add_done_callback(igangværende.discard)
+
+        await asyncio.gather(*igangværende)
+
+    return behandlet
+
+
+def rapporter_metrics(metrics_fil: str | None):
+    metrics.log_rapport(logger)
+    if metrics_fil:
+        metrics.eksporter_jsonl(metrics_fil)
+    metrics.nulstil()
+
+
+def kør_daemon(workqueue: Workqueue, args: argparse.Namespace):
+    stopsignal = Stopsignal()
+    stopsignal.installer()
+
+    backoff = Backoff(maksimum=args.max_idle_seconds)
+    klient_levetid = timedelta(minutes=args.client_max_age_minutes)
+    cursor = QueueCursor(
+        os.path.join(args.state_dir, "queue_cursor.json"), proces_skabelon_id
     )
+    næste_opfyldning = datetime.now()
+
+    def klienter_udløbet() -> bool:
+        oprettet = tjenester.klienter_oprettet
+        return oprettet is not None and datetime.now() - oprettet > klient_levetid
+
+    def skal_stoppe() -> bool:
+        return stopsignal.er_sat() or klienter_udløbet()
+
+    logger.info("Daemon startet")
+
+    while not stopsignal.er_sat():
+        try:
+            if klienter_udløbet():
+                logger.info("Fornyer Nexus- og XFlow-klienter")
+                tjenester.forny_klienter()
+
+            if datetime.now() >= næste_opfyldning:
+                asyncio.run(
+                    populate_queue(
+                        workqueue,
+                        cursor,
+                        overlap=timedelta(days=args.overlap_days),
+                        fuld_interval=timedelta(hours=args.full_rescan_hours),
+                    )
+                )
+                næste_opfyldning = datetime.now() + timedelta(
+                    seconds=args.queue_interval
+                )
+
+            behandlet = asyncio.run(
+                process_workqueue(
+                    workqueue,
+                    workers=args.workers,
+                    skal_stoppe=skal_stoppe,
+                    forudhent=args.prefetch,
+                    grupper=args.group_by_cpr,
+                )
+            )
+
+            if behandlet > 0:
+                rapporter_metrics(args.metrics_file)
+        except Exception as e:
+            logger.error(f"Fejl i daemon-løkken: {e}")
+            behandlet = 0
+
+        if behandlet > 0:
+            backoff.nulstil()
+            continue
+
+        til_opfyldning = (næste_opfyldning - datetime.now()).total_seconds()
+        stopsignal.vent(max(0, min(backoff.næste(), til_opfyldning)))
+
+    logger.info("Daemon stoppet")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
 
     # Parse command line arguments
     parser = argparse.ArgumentParser(description=proces_navn)
@@ -146,8 +418,149 @@ if __name__ == "__main__":
         action="store_true",
         help="Populate the queue with test data and exit",
     )
+    parser.add_argument(
+        "--full-rescan",
+        action="store_true",
+        help="With --queue: clear new items, forget the saved cursor and search the whole window",
+    )
+    parser.add_argument(
+        "--overlap-days",
+        type=int,
+        default=1,
+        help="Days before the previous queue population to search again (default: 1)",
+    )
+    parser.add_argument(
+        "--full-rescan-hours",
+        type=int,
+        default=24,
+        help="Hours between searches of the whole window when populating the queue (default: 24)",
+    )
+    parser.add_argument(
+        "--state-dir",
+        default="./.state",
+        help="Directory for local run state such as the queue cursor (default: ./.state)",
+    )
+    parser.add_argument(
+        "--watch-excel",
+        action="store_true",
+        help="Reload the Excel file in the background when it changes",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running: populate the queue and process items continuously until SIGTERM",
+    )
+    parser.add_argument(
+        "--queue-interval",
+        type=int,
+        default=60,
+        help="With --daemon: seconds between incremental queue populations (default: 60)",
+    )
+    parser.add_argument(
+        "--max-idle-seconds",
+        type=int,
+        default=60,
+        help="With --daemon: maximum backoff between polls of an empty queue (default: 60)",
+    )
+    parser.add_argument(
+        "--client-max-age-minutes",
+        type=int,
+        default=45,
+        help="With --daemon: recreate clients and tokens after this many minutes (default: 45)",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=None,
+        help="Append a per-step latency summary (JSON lines) to this file after each run",
+    )
+    parser.add_argument(
+        "--outbox-report",
+        action="store_true",
+        help="Print the XFlow write-back reconciliation report and exit",
+    )
+    parser.add_argument(
+        "--nexus-rate",
+        type=float,
+        default=10,
+        help="Initial Nexus calls per second; adapts to throttling (default: 10)",
+    )
+    parser.add_argument(
+        "--xflow-rate",
+        type=float,
+        default=10,
+        help="Initial XFlow calls per second; adapts to throttling (default: 10)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of work items processed concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=0,
+        help="Reserve this many upcoming items and download their XFlow documents ahead of time (default: 0)",
+    )
+    parser.add_argument(
+        "--prefetch-mb",
+        type=int,
+        default=256,
+        help="With --prefetch: maximum size of the prefetched documents in MB (default: 256)",
+    )
+    parser.add_argument(
+        "--group-by-cpr",
+        action="store_true",
+        help="With --prefetch: process reserved items for the same citizen together and set up citizen and pathway once",
+    )
+    parser.add_argument(
+        "--lease-store",
+        default=None,
+        help="Shared CPR leases when several robot instances process the same queue: mssql://server/database for instances on several hosts, or a local SQLite file for instances on this host",
+    )
+    parser.add_argument(
+        "--worker-id",
+        default=f"{socket.gethostname()}:{os.getpid()}",
+        help="With --lease-store: name of this instance (default: host:pid)",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        type=int,
+        default=120,
+        help="With --lease-store: seconds before a lease from a stopped instance can be taken over (default: 120)",
+    )
+    parser.add_argument(
+        "--step-concurrency",
+        type=int,
+        default=4,
+        help="Independent Nexus steps run concurrently within one item (default: 4)",
+    )
     args = parser.parse_args()
 
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.step_concurrency < 1:
+        parser.error("--step-concurrency must be at least 1")
+
+    if args.prefetch < 0:
+        parser.error("--prefetch must not be negative")
+    if args.group_by_cpr and args.prefetch == 0:
+        parser.error("--group-by-cpr requires --prefetch")
+
+    samtidige_trin = args.step_concurrency
+
+    nexus_begrænser.sæt_rate(args.nexus_rate)
+    xflow_begrænser.sæt_rate(args.xflow_rate)
+
+    # Klienter og credentials oprettes først, når den valgte tilstand bruger dem.
+    tjenester = Tjenester(args.state_dir, nexus_begrænser, xflow_begrænser)
+
+    if args.outbox_report:
+        print(
+            json.dumps(tjenester.xflow_outbox.rapport(), ensure_ascii=False, indent=2)
+        )
+        exit(0)
+
     # Validate Excel file exists
     if not os.path.isfile(args.excel_file):
         raise FileNotFoundError(f"Excel file not found: {args.excel_file}")
@@ -159,9 +572,68 @@ if __name__ == "__main__":
 
     # Queue management
     if "--queue" in sys.argv:
-        workqueue.clear_workqueue(WorkItemStatus.NEW)
-        asyncio.run(populate_queue(workqueue))
+        workqueue = tjenester.workqueue
+        cursor = QueueCursor(
+            os.path.join(args.state_dir, "queue_cursor.json"), proces_skabelon_id
+        )
+
+        if args.full_rescan:
+            workqueue.clear_workqueue(WorkItemStatus.NEW)
+            cursor.nulstil()
+
+        asyncio.run(
+            populate_queue(
+                workqueue,
+                cursor,
+                overlap=timedelta(days=args.overlap_days),
+                fuld_interval=timedelta(hours=args.full_rescan_hours),
+            )
+        )
+        rapporter_metrics(args.metrics_file)
         exit(0)
 
     # Process workqueue
-    asyncio.run(process_workqueue(workqueue))
+    workqueue = tjenester.workqueue
+    if args.lease_store:
+        cpr_leaser = CprLeaser(
+            tjenester.lease_lager(args.lease_store),
+            ejer=args.worker_id,
+            varighed=args.lease_seconds,
+        )
+        cpr_leaser.start()
+
+    if args.prefetch > 0:
+        tjenester.nexus_service.forudhenter = Forudhenter(
+            maks_bytes=args.prefetch_mb * 1024 * 1024
+        )
+
+    tjenester.nexus_service.forvarm_cache([borger_organisation])
+    tjenester.xflow_outbox.start()
+    tjenester.tracker.start()
+
+    regel_overvåger = RegelOvervåger(args.excel_file)
+    if args.watch_excel or args.daemon:
+        regel_overvåger.start()
+
+    try:
+        if args.daemon:
+            kør_daemon(workqueue, args)
+        else:
+            asyncio.run(
+                process_workqueue(
+                    workqueue,
+                    workers=args.workers,
+                    forudhent=args.prefetch,
+                    grupper=args.group_by_cpr,
+                )
+            )
+            rapporter_metrics(args.metrics_file)
+    finally:
+        regel_overvåger.stop()
+        if tjenester.nexus_service.forudhenter is not None:
+            tjenester.nexus_service.forudhenter.stop()
+        if cpr_leaser is not None:
+            cpr_leaser.stop()
+        tjenester.xflow_outbox.stop()
+        tjenester.xflow_outbox.log_rapport(logger)
+        tjenester.tracker.stop()
@@ -0,0 +1,45 @@
+import threading
+import time
+
+from typing import Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class TTLCache:
+    """Trådsikker opslags-cache, hvor hver værdi udløber efter `ttl` sekunder.
+
+    `None` caches ikke, så opslag der ikke gav et resultat prøves igen.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lås = threading.Lock()
+        self._værdier: dict[Hashable, tuple[float, object]] = {}
+
+    def hent(self, nøgle: Hashable, indlæs: Callable[[], T]) -> T:
+        with self._lås:
+            post = self._værdier.get(nøgle)
+            if post is not None and post[0] > time.monotonic():
+                return post[1]  # type: ignore[return-value]
+
+        værdi = indlæs()
+
+        if værdi is not None:
+            self.sæt(nøgle, værdi)
+
+        return værdi
+
+    def sæt(self, nøgle: Hashable, værdi: object) -> None:
+        with self._lås:
+            self._værdier[nøgle] = (time.monotonic() + self.ttl, værdi)
+
+    def glem(self, nøgle: Hashable) -> object | None:
+        """Fjerner nøglen og returnerer den værdi, der var cachet."""
+        with self._lås:
+            post = self._værdier.pop(nøgle, None)
+        return None if post is None else post[1]
+
+    def ryd(self) -> None:
+        with self._lås:
+            self._værdier.clear()
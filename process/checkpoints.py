@@ -0,0 +1,57 @@
+import threading
+
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+NØGLE = "Checkpoints"
+
+
+class Checkpoints:
+    """Registrerer gennemførte trin i et work items data.
+
+    Hvert trin gemmes sammen med det oprettede Nexus-objekt, så et retry af
+    itemet kan springe trinnet over og genbruge objektet i stedet for at
+    oprette det igen.
+    """
+
+    def __init__(self, item):
+        self.item = item
+        self._lås = threading.Lock()
+        self._data = dict(item.data)
+        self._trin: dict[str, object] = dict(self._data.get(NØGLE) or {})
+
+    def er_udført(self, trin: str) -> bool:
+        with self._lås:
+            return trin in self._trin
+
+    def marker(self, trin: str, resultat: object = None) -> None:
+        with self._lås:
+            self._trin[trin] = resultat
+            self._data[NØGLE] = dict(self._trin)
+            self.item.update(self._data)
+
+    def kør(self, trin: str, funktion: Callable[[], T], gem_resultat: bool = True) -> T:
+        """Kører `funktion`, medmindre trinnet allerede er udført.
+
+        Med `gem_resultat` gemmes funktionens resultat og returneres ved retry,
+        ellers registreres kun at trinnet er udført.
+        """
+        with self._lås:
+            if trin in self._trin:
+                return self._trin[trin]  # type: ignore[return-value]
+
+        resultat = funktion()
+        self.marker(trin, resultat if gem_resultat else None)
+        return resultat
+
+
+def kør_trin(
+    checkpoints: Checkpoints | None,
+    trin: str,
+    funktion: Callable[[], T],
+    gem_resultat: bool = True,
+) -> T:
+    if checkpoints is None:
+        return funktion()
+    return checkpoints.kør(trin, funktion, gem_resultat)
@@ -0,0 +1,31 @@
+import threading
+
+from contextlib import contextmanager
+
+
+class CprLåse:
+    """Låse pr. CPR, så ansøgninger for samme borger aldrig behandles samtidigt.
+
+    Låsene er reentrante, så en tråd, der allerede holder et CPR, kan tage det igen.
+    """
+
+    def __init__(self):
+        self._lås = threading.Lock()
+        self._låse: dict[str, threading.RLock] = {}
+        self._brugere: dict[str, int] = {}
+
+    @contextmanager
+    def lås(self, cpr: str):
+        with self._lås:
+            lås = self._låse.setdefault(cpr, threading.RLock())
+            self._brugere[cpr] = self._brugere.get(cpr, 0) + 1
+
+        try:
+            with lås:
+                yield
+        finally:
+            with self._lås:
+                self._brugere[cpr] -= 1
+                if self._brugere[cpr] == 0:
+                    del self._brugere[cpr]
+                    del self._låse[cpr]
@@ -1,7 +1,98 @@
-from typing import Dict
-from openpyxl import load_workbook
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Mapping
+
+SAGSOMRÅDER = "XFlow - Nexus oversættelse"
+ORGANISATIONER = "Opgaveansvarlig organisation"
+UDELADTE_TRIN = "Udeladte trin"
+FALLBACK = "Andet"
+# Øges, når `_læs_regneark` ændres, så gamle snapshots læses forfra.
+SNAPSHOT_VERSION = 2
+
+# Bruges, når regnearket ikke har arket UDELADTE_TRIN.
+STANDARD_UDELADTE_TRIN = {"andet": frozenset({"sagsnotat", "sagsbehandling"})}
+
+logger = logging.getLogger(__name__)
 
 excel_mappings: Dict[str, Dict[str, str]] = {}
+regler: "Regler | None" = None
+
+
+def _normaliser(tekst: str) -> str:
+    return " ".join(tekst.split()).casefold()
+
+
+def _normaliser_type(hjælpemiddel: str) -> str:
+    return _normaliser(hjælpemiddel.split("-")[0])
+
+
+@dataclass(frozen=True)
+class Regler:
+    """Forudberegnet, uforanderligt opslagsindeks over reglerne i regnearket."""
+
+    sagsområder: Mapping[str, str]
+    sagsområde_fallback: str | None
+    organisationer: Mapping[str, str]
+    organisation_fallback: str | None
+    version: str = ""
+    udeladte_trin: Mapping[str, frozenset[str]] = MappingProxyType(
+        STANDARD_UDELADTE_TRIN
+    )
+
+    @classmethod
+    def fra_mapping(
+        cls, mapping: Dict[str, Dict[str, str]], version: str = ""
+    ) -> "Regler":
+        for ark in (SAGSOMRÅDER, ORGANISATIONER):
+            for nøgle, værdi in mapping.get(ark, {}).items():
+                if not værdi.strip():
+                    raise ValueError(f"Tom værdi for '{nøgle}' i arket '{ark}'")
+
+        sagsområder = {
+            _normaliser(k): v.strip() for k, v in mapping.get(SAGSOMRÅDER, {}).items()
+        }
+        organisationer = {
+            _normaliser(k): v.strip()
+            for k, v in mapping.get(ORGANISATIONER, {}).items()
+        }
+
+        udeladte_trin = STANDARD_UDELADTE_TRIN
+        if UDELADTE_TRIN in mapping:
+            udeladte_trin = {
+                _normaliser_type(k): frozenset(
+                    _normaliser(t) for t in v.split(",") if t.strip()
+                )
+                for k, v in mapping[UDELADTE_TRIN].items()
+            }
+
+        return cls(
+            sagsområder=MappingProxyType(sagsområder),
+            sagsområde_fallback=sagsområder.get(_normaliser(FALLBACK)),
+            organisationer=MappingProxyType(organisationer),
+            organisation_fallback=organisationer.get(_normaliser(FALLBACK)),
+            version=version,
+            udeladte_trin=MappingProxyType(udeladte_trin),
+        )
+
+    def sagsområde(self, hjælpemiddel: str) -> str | None:
+        """Sagsområde-tag i Nexus for det fulde hjælpemiddel fra XFlow."""
+        return self.sagsområder.get(_normaliser(hjælpemiddel), self.sagsområde_fallback)
+
+    def ansvarlig_organisation(self, hjælpemiddel: str) -> str | None:
+        """Opgaveansvarlig organisation ud fra hjælpemiddeltypen før første '-'."""
+        return self.organisationer.get(
+            _normaliser_type(hjælpemiddel), self.organisation_fallback
+        )
+
+    def udeladte_trin_for(self, hjælpemiddel: str) -> frozenset[str]:
+        """Trin, der springes over for hjælpemiddeltypen, fx sagsnotat for 'Andet'."""
+        return self.udeladte_trin.get(_normaliser_type(hjælpemiddel), frozenset())
 
 
 def get_excel_mapping() -> Dict[str, Dict[str, str]]:
@@ -12,22 +103,163 @@ def get_excel_mapping() -> Dict[str, Dict[str, str]]:
     return excel_mappings
 
 
-def load_excel_mapping(file_path: str):
-    global excel_mappings
+def get_regler() -> Regler:
+    """Henter det forudberegnede regelindeks"""
+    if regler is None:
+        raise ValueError("excel-mapping er ikke indlæst, brug load_excel_mapping først")
+    return regler
 
+
+def _læs_regneark(file_path: str) -> Dict[str, Dict[str, str]]:
+    # openpyxl importeres først her, da et gyldigt snapshot ikke kræver den.
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True)
     try:
-        workbook = load_workbook(file_path)
         result = {}
         for worksheet in workbook.worksheets:
             mapping = {}
             for row in worksheet.iter_rows(min_row=2, max_col=2, values_only=True):
+                if len(row) < 2:
+                    continue
                 key, value = row[0], row[1]
-                if key is not None and value is not None:
-                    mapping[str(key)] = str(value)
+                # Rækker med tom værdi beholdes, så `Regler.fra_mapping` kan
+                # afvise dem i stedet for at falde tilbage til FALLBACK.
+                if key is not None:
+                    mapping[str(key)] = "" if value is None else str(value)
             result[worksheet.title] = mapping
+        return result
+    finally:
+        workbook.close()
+
+
+def _filhash(file_path: str) -> str:
+    with open(file_path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _indlæs_med_snapshot(file_path: str) -> tuple[Dict[str, Dict[str, str]], str]:
+    """Indlæser regnearket via et lokalt JSON-snapshot, der kun genskabes ved ændringer.
 
+    Snapshottet bruges direkte, når filens mtime og størrelse er uændret, og
+    ellers når SHA-256 af filen stadig matcher. Returnerer mapping og SHA-256.
+    """
+    snapshot_sti = f"{file_path}.snapshot.json"
+    stat = os.stat(file_path)
+    snapshot = None
+
+    try:
+        with open(snapshot_sti, encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    if snapshot is not None and snapshot.get("version") != SNAPSHOT_VERSION:
+        snapshot = None
+
+    if (
+        snapshot is not None
+        and snapshot.get("mtime_ns") == stat.st_mtime_ns
+        and snapshot.get("size") == stat.st_size
+    ):
+        return snapshot["mapping"], snapshot["sha256"]
+
+    sha256 = _filhash(file_path)
+    if snapshot is not None and snapshot.get("sha256") == sha256:
+        mapping = snapshot["mapping"]
+    else:
+        mapping = _læs_regneark(file_path)
+
+    try:
+        midlertidig_sti = f"{snapshot_sti}.tmp"
+        with open(midlertidig_sti, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": SNAPSHOT_VERSION,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                    "sha256": sha256,
+                    "mapping": mapping,
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(midlertidig_sti, snapshot_sti)
+    except OSError as e:
+        logger.warning(f"Kunne ikke gemme snapshot af '{file_path}': {e}")
+
+    return mapping, sha256
+
+
+def load_excel_mapping(file_path: str):
+    global excel_mappings, regler
+
+    try:
+        result, sha256 = _indlæs_med_snapshot(file_path)
+
+        # Reglerne bygges færdigt, før de udskiftes, så læsere altid ser en
+        # komplet version.
+        regler = Regler.fra_mapping(result, version=sha256[:12])
         excel_mappings = result
     except Exception as e:
         raise RuntimeError(
             f"Failed to load mapping from Excel file '{file_path}': {str(e)}"
         ) from e
+
+
+class RegelOvervåger:
+    """Overvåger regnearket i en baggrundstråd og indlæser det igen ved ændringer.
+
+    Items der allerede er i gang beholder det `Regler`-objekt, de startede med.
+    Fejler en ny indlæsning, fortsættes med de hidtidige regler.
+    """
+
+    def __init__(self, file_path: str, interval: float = 30):
+        self.file_path = file_path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._tråd: threading.Thread | None = None
+        self._sidst_set = self._filstatus()
+
+    def _filstatus(self) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def tjek(self) -> bool:
+        """Indlæser regnearket, hvis det er ændret. Returnerer True ved ny version."""
+        status = self._filstatus()
+        if status is None or status == self._sidst_set:
+            return False
+
+        forrige_version = regler.version if regler is not None else None
+        try:
+            load_excel_mapping(self.file_path)
+        except Exception as e:
+            logger.error(f"Kunne ikke genindlæse regler fra '{self.file_path}': {e}")
+            return False
+
+        self._sidst_set = status
+        ny_version = get_regler().version
+        if ny_version == forrige_version:
+            return False
+
+        logger.info(f"Regler genindlæst: version {forrige_version} -> {ny_version}")
+        return True
+
+    def _kør(self):
+        while not self._stop.wait(self.interval):
+            self.tjek()
+
+    def start(self):
+        self._tråd = threading.Thread(
+            target=self._kør, name="RegelOvervåger", daemon=True
+        )
+        self._tråd.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._tråd is not None:
+            self._tråd.join()
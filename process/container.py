@@ -0,0 +1,180 @@
+import os
+
+from datetime import datetime
+from functools import cached_property
+from process.metrics import metrics
+from process.ratelimit import AdaptivBegrænser, BegrænsetKlient
+from process.tracking import BufferetTracker
+
+# Klient-attributter, der genoprettes ved `forny_klienter`.
+KLIENTER = ("nexus", "xflow_client", "xflow_process_client", "xflow_document_client")
+
+
+class Tjenester:
+    """Opretter credentials, klienter og services dovent, første gang de bruges.
+
+    Klientbibliotekerne importeres også først ved brug, så fx `--queue` kun
+    henter XFlow-credentials og aldrig indlæser Nexus- eller tracking-klienten.
+    """
+
+    def __init__(
+        self,
+        state_dir: str,
+        nexus_begrænser: AdaptivBegrænser,
+        xflow_begrænser: AdaptivBegrænser,
+    ):
+        self.state_dir = state_dir
+        self.nexus_begrænser = nexus_begrænser
+        self.xflow_begrænser = xflow_begrænser
+        self.klienter_oprettet: datetime | None = None
+
+    def _credential(self, navn: str):
+        from automation_server_client import Credential
+
+        return Credential.get_credential(navn)
+
+    def _klient_oprettet(self):
+        if self.klienter_oprettet is None:
+            self.klienter_oprettet = datetime.now()
+
+    @cached_property
+    def workqueue(self):
+        from automation_server_client import AutomationServer
+
+        return AutomationServer.from_environment().workqueue()
+
+    @cached_property
+    def nexus(self):
+        from kmd_nexus_client import NexusClientManager
+
+        nexus_credential = self._credential("KMD Nexus - produktion")
+        self._klient_oprettet()
+
+        return BegrænsetKlient(
+            metrics.instrumenter(
+                NexusClientManager(
+                    client_id=nexus_credential.username,
+                    client_secret=nexus_credential.password,
+                    instance=nexus_credential.data["instance"],
+                ),
+                "nexus",
+            ),
+            self.nexus_begrænser,
+        )
+
+    @cached_property
+    def xflow_client(self):
+        from xflow_client import XFlowClient
+
+        xflow_credential = self._credential("Xflow - produktion")
+        self._klient_oprettet()
+
+        return XFlowClient(
+            token=xflow_credential.password,
+            instance=xflow_credential.data["instance"],
+        )
+
+    @cached_property
+    def xflow_process_client(self):
+        from xflow_client import ProcessClient
+
+        return BegrænsetKlient(
+            metrics.instrumenter(ProcessClient(self.xflow_client), "xflow.process"),
+            self.xflow_begrænser,
+        )
+
+    @cached_property
+    def xflow_document_client(self):
+        from xflow_client import DocumentClient
+
+        return BegrænsetKlient(
+            metrics.instrumenter(DocumentClient(self.xflow_client), "xflow.document"),
+            self.xflow_begrænser,
+        )
+
+    @cached_property
+    def xflow_service(self):
+        from process.xflow_service import XFlowService
+
+        return XFlowService(self.xflow_client, self.xflow_process_client)
+
+    @cached_property
+    def nexus_service(self):
+        from process.dokumentindeks import DokumentIndeks
+        from process.nexus_service import NexusService
+
+        return NexusService(
+            self.nexus,
+            xflow_process_client=self.xflow_process_client,
+            xflow_document_client=self.xflow_document_client,
+            dokumentindeks=DokumentIndeks(
+                os.path.join(self.state_dir, "dokumentindeks.sqlite")
+            ),
+        )
+
+    @cached_property
+    def xflow_outbox(self):
+        from process.outbox import XFlowOutbox
+
+        return XFlowOutbox(
+            os.path.join(self.state_dir, "xflow_outbox.sqlite"),
+            hent_xflow_service=lambda: self.xflow_service,
+            hent_process_client=lambda: self.xflow_process_client,
+        )
+
+    @cached_property
+    def tracker(self) -> BufferetTracker:
+        from odk_tools.tracking import Tracker
+
+        tracking_credential = self._credential("Odense SQL Server")
+
+        return BufferetTracker(
+            Tracker(
+                username=tracking_credential.username,
+                password=tracking_credential.password,
+            ),
+            spill_sti=os.path.join(self.state_dir, "tracking_spill.json"),
+        )
+
+    def lease_lager(self, sted: str):
+        """Lease-lager til `--lease-store`.
+
+        `mssql://server/database` giver en tabel i SQL Server, som instanser på
+        flere værter kan dele; alt andet er stien til en lokal SQLite-fil.
+        """
+        from process.leases import SqliteLeaseLager, SqlServerLeaseLager
+
+        if not sted.startswith("mssql://"):
+            return SqliteLeaseLager(sted)
+
+        server, _, database = sted.removeprefix("mssql://").partition("/")
+        if not server or not database:
+            raise ValueError(
+                f"Lease-lageret '{sted}' skal have formen mssql://server/database"
+            )
+
+        credential = self._credential("Odense SQL Server")
+        return SqlServerLeaseLager(
+            server, database, credential.username, credential.password
+        )
+
+    def er_oprettet(self, navn: str) -> bool:
+        return navn in self.__dict__
+
+    def forny_klienter(self):
+        """Genopretter de klienter, der er i brug, med friske credentials og tokens.
+
+        Services og deres caches beholdes og får blot de nye klienter.
+        """
+        i_brug = [navn for navn in KLIENTER if self.er_oprettet(navn)]
+        for navn in i_brug:
+            del self.__dict__[navn]
+        self.klienter_oprettet = None
+
+        if self.er_oprettet("xflow_service"):
+            self.xflow_service.xflow_client = self.xflow_client
+            self.xflow_service.xflow_process_client = self.xflow_process_client
+        if self.er_oprettet("nexus_service"):
+            self.nexus_service.nexus = self.nexus
+            self.nexus_service.xflow_process = self.xflow_process_client
+            self.nexus_service.xflow_document = self.xflow_document_client
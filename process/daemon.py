@@ -0,0 +1,51 @@
+import logging
+import random
+import signal
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Backoff:
+    """Eksponentiel ventetid mellem tomme poll af køen."""
+
+    def __init__(self, minimum: float = 5, maksimum: float = 300, faktor: float = 2):
+        self.minimum = minimum
+        self.maksimum = maksimum
+        self.faktor = faktor
+        self._næste = minimum
+
+    def næste(self) -> float:
+        ventetid = self._næste
+        self._næste = min(self._næste * self.faktor, self.maksimum)
+        return ventetid * random.uniform(0.9, 1.1)
+
+    def nulstil(self):
+        self._næste = self.minimum
+
+
+class Stopsignal:
+    """Sættes ved SIGTERM/SIGINT, så igangværende items kan gøres færdige før lukning."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def installer(self):
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._modtag)
+
+    def _modtag(self, signum, frame):
+        if self._event.is_set():
+            raise KeyboardInterrupt
+
+        logger.info(
+            f"Modtog {signal.Signals(signum).name}, lukker efter igangværende items"
+        )
+        self._event.set()
+
+    def er_sat(self) -> bool:
+        return self._event.is_set()
+
+    def vent(self, sekunder: float) -> bool:
+        """Venter op til `sekunder` og returnerer True, hvis der blev bedt om stop."""
+        return self._event.wait(sekunder)
@@ -0,0 +1,83 @@
+import base64
+
+from dataclasses import dataclass
+from tempfile import SpooledTemporaryFile
+from typing import IO
+
+# Base64-tekst dekodes i blokke af denne størrelse (skal gå op i 4).
+BLOKSTØRRELSE = 1024 * 1024
+
+
+def dekod_base64(data: str, spool_grænse: int, hasher=None) -> SpooledTemporaryFile:
+    """Dekoder base64-tekst blokvis til en fil, der spooles til disk over `spool_grænse` bytes.
+
+    Er `hasher` givet (fx `hashlib.sha256()`), opdateres den med indholdet
+    undervejs. Filen er spolet tilbage til start, når den returneres.
+    """
+    fil = SpooledTemporaryFile(max_size=spool_grænse)
+
+    try:
+        rest = ""
+        for start in range(0, len(data), BLOKSTØRRELSE):
+            blok = rest + "".join(data[start : start + BLOKSTØRRELSE].split())
+            slut = len(blok) - len(blok) % 4
+            dekodet = base64.b64decode(blok[:slut], validate=True)
+            if hasher is not None:
+                hasher.update(dekodet)
+            fil.write(dekodet)
+            rest = blok[slut:]
+
+        if rest:
+            raise ValueError("Ugyldig base64-længde")
+    except Exception:
+        fil.close()
+        raise
+
+    fil.seek(0)
+    return fil
+
+
+def spool_bytes(data: bytes, spool_grænse: int, hasher=None) -> SpooledTemporaryFile:
+    """Skriver bytes blokvis til en fil, der spooles til disk over `spool_grænse` bytes.
+
+    Kalderen kan dermed slippe det oprindelige bytes-objekt, mens dokumentet
+    venter på upload. `hasher` opdateres som i `dekod_base64`.
+    """
+    fil = SpooledTemporaryFile(max_size=spool_grænse)
+    visning = memoryview(data)
+
+    try:
+        for start in range(0, len(visning), BLOKSTØRRELSE):
+            blok = visning[start : start + BLOKSTØRRELSE]
+            if hasher is not None:
+                hasher.update(blok)
+            fil.write(blok)
+    except Exception:
+        fil.close()
+        raise
+    finally:
+        visning.release()
+
+    fil.seek(0)
+    return fil
+
+
+@dataclass
+class Dokument:
+    """Et dokument på vej fra XFlow til Nexus. Indholdet ligger i `fil` og læses som stream."""
+
+    filnavn: str
+    titel: str
+    indholdstype: str
+    fil: IO[bytes]
+    størrelse: int = 0
+    sha256: str = ""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.fil.close()
@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import threading
+
+from contextlib import closing
+from datetime import datetime
+
+
+class DokumentIndeks:
+    """Persistent indeks over dokumenter, der allerede er uploadet til et forløb i Nexus.
+
+    Dokumenter identificeres ved borger, forløb, SHA-256 af indholdet og
+    filnavn. Kendes XFlow-dokumentets ID også, kan hentningen fra XFlow
+    springes over næste gang samme dokument optræder på forløbet.
+    """
+
+    def __init__(self, sti: str):
+        self.sti = sti
+        self._lås = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(sti)), exist_ok=True)
+        with closing(self._forbindelse()) as db:
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dokumenter (
+                    borger_id TEXT NOT NULL,
+                    forløb_id TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    filnavn TEXT NOT NULL,
+                    størrelse INTEGER,
+                    uploadet TEXT NOT NULL,
+                    PRIMARY KEY (borger_id, forløb_id, sha256, filnavn)
+                )
+                """
+            )
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS xflow_dokumenter (
+                    borger_id TEXT NOT NULL,
+                    forløb_id TEXT NOT NULL,
+                    xflow_id TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    PRIMARY KEY (borger_id, forløb_id, xflow_id)
+                )
+                """
+            )
+
+    def _forbindelse(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.sti, timeout=30, isolation_level=None)
+
+    def _udfør(self, sql: str, parametre: tuple = ()) -> list[tuple]:
+        with self._lås, closing(self._forbindelse()) as db:
+            return db.execute(sql, parametre).fetchall()
+
+    def er_uploadet(
+        self, borger: dict, forløb: dict, sha256: str, filnavn: str
+    ) -> bool:
+        return bool(
+            self._udfør(
+                "SELECT 1 FROM dokumenter WHERE borger_id = ? AND forløb_id = ? "
+                "AND sha256 = ? AND filnavn = ?",
+                (f"{borger['id']}", f"{forløb['id']}", sha256, filnavn),
+            )
+        )
+
+    def kender_xflow_dokument(self, borger: dict, forløb: dict, xflow_id: str) -> bool:
+        return bool(
+            self._udfør(
+                "SELECT 1 FROM xflow_dokumenter WHERE borger_id = ? "
+                "AND forløb_id = ? AND xflow_id = ?",
+                (f"{borger['id']}", f"{forløb['id']}", f"{xflow_id}"),
+            )
+        )
+
+    def registrer(
+        self,
+        borger: dict,
+        forløb: dict,
+        sha256: str,
+        filnavn: str,
+        xflow_id: str | None = None,
+        størrelse: int | None = None,
+    ) -> None:
+        nøgle = (f"{borger['id']}", f"{forløb['id']}")
+        self._udfør(
+            "INSERT OR IGNORE INTO dokumenter "
+            "(borger_id, forløb_id, sha256, filnavn, størrelse, uploadet) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (*nøgle, sha256, filnavn, størrelse, datetime.now().isoformat()),
+        )
+        if xflow_id is not None:
+            self._udfør(
+                "INSERT OR IGNORE INTO xflow_dokumenter "
+                "(borger_id, forløb_id, xflow_id, sha256) VALUES (?, ?, ?, ?)",
+                (*nøgle, f"{xflow_id}", sha256),
+            )
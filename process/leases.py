@@ -0,0 +1,305 @@
+import hashlib
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from contextlib import closing, contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class HukommelsesLeaseLager:
+    """Lease-lager i hukommelsen. Til tests og flere workers i samme proces."""
+
+    def __init__(self):
+        self._lås = threading.Lock()
+        self._leases: dict[str, tuple[str, float]] = {}
+
+    def prøv_at_tage(self, nøgle: str, ejer: str, varighed: float) -> bool:
+        nu = time.time()
+        with self._lås:
+            nuværende = self._leases.get(nøgle)
+            if nuværende is not None and nuværende[0] != ejer and nuværende[1] > nu:
+                return False
+            self._leases[nøgle] = (ejer, nu + varighed)
+            return True
+
+    def forny(self, nøgle: str, ejer: str, varighed: float) -> bool:
+        with self._lås:
+            nuværende = self._leases.get(nøgle)
+            if nuværende is None or nuværende[0] != ejer:
+                return False
+            self._leases[nøgle] = (ejer, time.time() + varighed)
+            return True
+
+    def frigiv(self, nøgle: str, ejer: str) -> None:
+        with self._lås:
+            if self._leases.get(nøgle, (None,))[0] == ejer:
+                del self._leases[nøgle]
+
+
+class SqliteLeaseLager:
+    """Lease-lager i en SQLite-database, som flere processer på samme vært kan dele.
+
+    Filen skal ligge på en lokal disk. SQLites fillåsning er ikke pålidelig
+    over netværksdrev (SMB/NFS), så to værter vil kunne holde samme lease.
+    Udløbne leases overtages automatisk af den næste, der beder om dem.
+    """
+
+    def __init__(self, sti: str):
+        if sti.startswith(("\\\\", "//")):
+            raise ValueError(
+                f"Lease-lageret '{sti}' skal ligge på en lokal disk, ikke et netværksdrev"
+            )
+
+        self.sti = sti
+        os.makedirs(os.path.dirname(os.path.abspath(sti)), exist_ok=True)
+        with closing(self._forbindelse()) as db:
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS leases (
+                    nøgle TEXT PRIMARY KEY,
+                    ejer TEXT NOT NULL,
+                    udløber REAL NOT NULL
+                )
+                """
+            )
+
+    def _forbindelse(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.sti, timeout=30, isolation_level=None)
+
+    def prøv_at_tage(self, nøgle: str, ejer: str, varighed: float) -> bool:
+        nu = time.time()
+        with closing(self._forbindelse()) as db:
+            markør = db.execute(
+                """
+                INSERT INTO leases (nøgle, ejer, udløber) VALUES (?, ?, ?)
+                ON CONFLICT (nøgle) DO UPDATE SET
+                    ejer = excluded.ejer, udløber = excluded.udløber
+                WHERE leases.ejer = excluded.ejer OR leases.udløber <= ?
+                """,
+                (nøgle, ejer, nu + varighed, nu),
+            )
+            return markør.rowcount == 1
+
+    def forny(self, nøgle: str, ejer: str, varighed: float) -> bool:
+        with closing(self._forbindelse()) as db:
+            markør = db.execute(
+                "UPDATE leases SET udløber = ? WHERE nøgle = ? AND ejer = ?",
+                (time.time() + varighed, nøgle, ejer),
+            )
+            return markør.rowcount == 1
+
+    def frigiv(self, nøgle: str, ejer: str) -> None:
+        with closing(self._forbindelse()) as db:
+            db.execute("DELETE FROM leases WHERE nøgle = ? AND ejer = ?", (nøgle, ejer))
+
+
+class SqlServerLeaseLager:
+    """Lease-lager i en SQL Server-tabel, som robot-instanser på flere værter kan dele.
+
+    Udløbstider regnes i databasens ur, så værternes ure ikke skal stemme
+    overens. Tabellen oprettes, hvis den ikke findes, og der åbnes en ny
+    forbindelse pr. kald, så et afbrudt netværk ikke efterlader en død forbindelse.
+    """
+
+    def __init__(
+        self,
+        server: str,
+        database: str,
+        bruger: str,
+        adgangskode: str,
+        tabel: str = "cpr_leases",
+    ):
+        if not tabel.isidentifier():
+            raise ValueError(f"Ugyldigt tabelnavn til leases: '{tabel}'")
+
+        self.server = server
+        self.database = database
+        self.bruger = bruger
+        self.adgangskode = adgangskode
+        self.tabel = tabel
+        self._udfør(
+            f"""
+            IF OBJECT_ID(N'{tabel}', N'U') IS NULL
+                CREATE TABLE {tabel} (
+                    noegle NVARCHAR(64) NOT NULL PRIMARY KEY,
+                    ejer NVARCHAR(255) NOT NULL,
+                    udloeber DATETIME2 NOT NULL
+                )
+            """
+        )
+
+    def _forbindelse(self):
+        import pymssql
+
+        return pymssql.connect(
+            server=self.server,
+            user=self.bruger,
+            password=self.adgangskode,
+            database=self.database,
+            login_timeout=30,
+            timeout=30,
+            autocommit=True,
+        )
+
+    def _udfør(self, sql: str, parametre: tuple = ()) -> int:
+        with closing(self._forbindelse()) as db, closing(db.cursor()) as markør:
+            markør.execute(sql, parametre)
+            return markør.rowcount
+
+    def prøv_at_tage(self, nøgle: str, ejer: str, varighed: float) -> bool:
+        millisekunder = int(varighed * 1000)
+        return (
+            self._udfør(
+                f"""
+                MERGE {self.tabel} WITH (HOLDLOCK) AS l
+                USING (SELECT %s AS noegle) AS n ON l.noegle = n.noegle
+                WHEN MATCHED AND (l.ejer = %s OR l.udloeber <= SYSUTCDATETIME()) THEN
+                    UPDATE SET
+                        ejer = %s,
+                        udloeber = DATEADD(millisecond, %s, SYSUTCDATETIME())
+                WHEN NOT MATCHED THEN
+                    INSERT (noegle, ejer, udloeber)
+                    VALUES (n.noegle, %s, DATEADD(millisecond, %s, SYSUTCDATETIME()));
+                """,
+                (nøgle, ejer, ejer, millisekunder, ejer, millisekunder),
+            )
+            == 1
+        )
+
+    def forny(self, nøgle: str, ejer: str, varighed: float) -> bool:
+        return (
+            self._udfør(
+                f"""
+                UPDATE {self.tabel}
+                SET udloeber = DATEADD(millisecond, %s, SYSUTCDATETIME())
+                WHERE noegle = %s AND ejer = %s
+                """,
+                (int(varighed * 1000), nøgle, ejer),
+            )
+            == 1
+        )
+
+    def frigiv(self, nøgle: str, ejer: str) -> None:
+        self._udfør(
+            f"DELETE FROM {self.tabel} WHERE noegle = %s AND ejer = %s", (nøgle, ejer)
+        )
+
+
+class CprLeaser:
+    """Tidsbegrænsede leases pr. CPR-partition, delt mellem flere robot-instanser.
+
+    Hvor langt instanserne kan spredes, afgøres af lageret; med
+    `SqliteLeaseLager` skal de køre på samme vært, med `SqlServerLeaseLager`
+    kan de køre på flere.
+
+    CPR-numre fordeles på `partitioner` partitioner via SHA-256, så lageret
+    aldrig ser selve CPR-nummeret. En baggrundstråd fornyer de leases,
+    instansen holder, og stopper en instans, udløber dens leases efter
+    `varighed` sekunder og kan overtages af andre. Kan en lease ikke fornyes,
+    regnes den for mistet, og `holder` svarer nej, indtil alle, der bruger
+    den, har sluppet den.
+    """
+
+    def __init__(
+        self,
+        lager,
+        ejer: str,
+        varighed: float = 120,
+        partitioner: int = 4096,
+        ventetid: float = 1,
+    ):
+        self.lager = lager
+        self.ejer = ejer
+        self.varighed = varighed
+        self.partitioner = partitioner
+        self.ventetid = ventetid
+        self._lås = threading.Lock()
+        self._holdte: dict[str, int] = {}
+        # Monotont tidspunkt for seneste vellykkede overtagelse eller fornyelse.
+        self._fornyet: dict[str, float] = {}
+        self._stop = threading.Event()
+        self._tråd: threading.Thread | None = None
+
+    def nøgle(self, cpr: str) -> str:
+        hash = hashlib.sha256(cpr.encode("utf-8")).digest()
+        return f"cpr:{int.from_bytes(hash[:8], 'big') % self.partitioner}"
+
+    @contextmanager
+    def lås(self, cpr: str):
+        """Venter, til instansen har lease på CPR'ets partition, og holder den i blokken."""
+        nøgle = self.nøgle(cpr)
+
+        while True:
+            with self._lås:
+                if nøgle in self._holdte:
+                    if self._gyldig(nøgle):
+                        # Partitionen er allerede vores; de lokale CPR-låse
+                        # sørger for rækkefølgen inden for instansen.
+                        self._holdte[nøgle] += 1
+                        break
+                    # En mistet lease tages først igen, når alle har sluppet den.
+                elif self.lager.prøv_at_tage(nøgle, self.ejer, self.varighed):
+                    self._holdte[nøgle] = 1
+                    self._fornyet[nøgle] = time.monotonic()
+                    break
+            time.sleep(self.ventetid * random.uniform(0.5, 1.5))
+
+        try:
+            yield
+        finally:
+            with self._lås:
+                self._holdte[nøgle] -= 1
+                if self._holdte[nøgle] == 0:
+                    del self._holdte[nøgle]
+                    self._fornyet.pop(nøgle, None)
+                    try:
+                        self.lager.frigiv(nøgle, self.ejer)
+                    except Exception as e:
+                        # Leasen udløber af sig selv efter `varighed`.
+                        logger.warning(f"Kunne ikke frigive lease på {nøgle}: {e}")
+
+    def _gyldig(self, nøgle: str) -> bool:
+        fornyet = self._fornyet.get(nøgle)
+        return fornyet is not None and time.monotonic() - fornyet < self.varighed
+
+    def holder(self, cpr: str) -> bool:
+        """Om instansen stadig med sikkerhed holder leasen på CPR'ets partition."""
+        nøgle = self.nøgle(cpr)
+        with self._lås:
+            return nøgle in self._holdte and self._gyldig(nøgle)
+
+    def forny_alle(self) -> None:
+        with self._lås:
+            nøgler = [n for n in self._holdte if n in self._fornyet]
+
+        for nøgle in nøgler:
+            try:
+                fornyet = time.monotonic()
+                if self.lager.forny(nøgle, self.ejer, self.varighed):
+                    with self._lås:
+                        if nøgle in self._fornyet:
+                            self._fornyet[nøgle] = fornyet
+                else:
+                    with self._lås:
+                        self._fornyet.pop(nøgle, None)
+                    logger.error(f"Lease på {nøgle} er mistet for {self.ejer}")
+            except Exception as e:
+                logger.warning(f"Kunne ikke forny lease på {nøgle}: {e}")
+
+    def _kør(self):
+        while not self._stop.wait(self.varighed / 3):
+            self.forny_alle()
+
+    def start(self):
+        self._tråd = threading.Thread(target=self._kør, name="CprLeaser", daemon=True)
+        self._tråd.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._tråd is not None:
+            self._tråd.join()
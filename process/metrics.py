@@ -0,0 +1,199 @@
+import functools
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+from datetime import datetime
+
+
+def _størrelse(værdi) -> int:
+    if isinstance(værdi, (bytes, bytearray, memoryview)):
+        return len(værdi)
+    if isinstance(værdi, str):
+        return len(værdi)
+    if isinstance(værdi, dict) and isinstance(værdi.get("byteArray"), str):
+        # Dokumenter fra XFlow kommer base64-kodet i JSON.
+        return len(værdi["byteArray"]) * 3 // 4
+    if hasattr(værdi, "seek") and hasattr(værdi, "tell"):
+        try:
+            position = værdi.tell()
+            værdi.seek(0, os.SEEK_END)
+            størrelse = værdi.tell()
+            værdi.seek(position)
+            return størrelse
+        except (OSError, ValueError):
+            return 0
+    return 0
+
+
+def _percentil(sorterede: list[float], p: float) -> float:
+    if not sorterede:
+        return 0.0
+    return sorterede[max(0, math.ceil(p / 100 * len(sorterede)) - 1)]
+
+
+class Metrics:
+    """Trådsikker opsamling af varighed, antal kald, fejl og payload-bytes pr. trin.
+
+    Hændelser uden en varighed, fx dokumenter der springes over, tælles med `tæl`.
+    """
+
+    def __init__(self):
+        self._lås = threading.Lock()
+        self._varigheder: dict[str, list[float]] = {}
+        self._fejl: dict[str, int] = {}
+        self._bytes: dict[str, int] = {}
+        self._tællere: dict[str, int] = {}
+
+    def registrer(
+        self, trin: str, varighed: float, payload: int = 0, fejl: bool = False
+    ):
+        with self._lås:
+            self._varigheder.setdefault(trin, []).append(varighed)
+            self._bytes[trin] = self._bytes.get(trin, 0) + payload
+            if fejl:
+                self._fejl[trin] = self._fejl.get(trin, 0) + 1
+
+    def tæl(self, navn: str, antal: int = 1):
+        with self._lås:
+            self._tællere[navn] = self._tællere.get(navn, 0) + antal
+
+    @contextmanager
+    def mål(self, trin: str):
+        start = time.perf_counter()
+        fejl = False
+        try:
+            yield
+        except BaseException:
+            fejl = True
+            raise
+        finally:
+            self.registrer(trin, time.perf_counter() - start, fejl=fejl)
+
+    def målt(self, trin: str):
+        """Decorator, der måler hvert kald af funktionen som `trin`."""
+
+        def decorator(funktion):
+            @functools.wraps(funktion)
+            def wrapper(*args, **kwargs):
+                with self.mål(trin):
+                    return funktion(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def instrumenter(self, klient, navn: str):
+        """Pakker en klient ind, så alle udgående metodekald måles som `navn.metode`."""
+        return InstrumenteretKlient(klient, navn, self)
+
+    def opsummering(self) -> dict[str, dict]:
+        with self._lås:
+            varigheder = {t: sorted(v) for t, v in self._varigheder.items()}
+            fejl = dict(self._fejl)
+            payload = dict(self._bytes)
+
+        return {
+            trin: {
+                "antal": len(v),
+                "fejl": fejl.get(trin, 0),
+                "p50_ms": round(_percentil(v, 50) * 1000, 1),
+                "p95_ms": round(_percentil(v, 95) * 1000, 1),
+                "max_ms": round(v[-1] * 1000, 1),
+                "bytes": payload.get(trin, 0),
+            }
+            for trin, v in sorted(varigheder.items())
+        }
+
+    def tællere(self) -> dict[str, int]:
+        with self._lås:
+            return dict(sorted(self._tællere.items()))
+
+    def log_rapport(self, logger: logging.Logger):
+        for trin, tal in self.opsummering().items():
+            logger.info(
+                f"{trin}: {tal['antal']} kald, {tal['fejl']} fejl, "
+                f"p50 {tal['p50_ms']} ms, p95 {tal['p95_ms']} ms, "
+                f"max {tal['max_ms']} ms, {tal['bytes']} bytes"
+            )
+        for navn, antal in self.tællere().items():
+            logger.info(f"{navn}: {antal}")
+
+    def eksporter_jsonl(self, sti: str):
+        """Tilføjer én JSON-linje pr. trin og pr. tæller med kørslens opsummering."""
+        tidspunkt = datetime.now().isoformat(timespec="seconds")
+        with open(sti, "a", encoding="utf-8") as f:
+            for trin, tal in self.opsummering().items():
+                f.write(
+                    json.dumps(
+                        {"tidspunkt": tidspunkt, "trin": trin, **tal},
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                )
+            for navn, antal in self.tællere().items():
+                f.write(
+                    json.dumps(
+                        {"tidspunkt": tidspunkt, "tæller": navn, "antal": antal},
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                )
+
+    def nulstil(self):
+        with self._lås:
+            self._varigheder.clear()
+            self._fejl.clear()
+            self._bytes.clear()
+            self._tællere.clear()
+
+
+class InstrumenteretKlient:
+    """Proxy, der måler metodekald på en klient og dens underklienter."""
+
+    def __init__(self, klient, navn: str, metrics: Metrics):
+        self._klient = klient
+        self._navn = navn
+        self._metrics = metrics
+
+    def __getattr__(self, attribut: str):
+        værdi = getattr(self._klient, attribut)
+        navn = f"{self._navn}.{attribut}"
+
+        if attribut.startswith("_"):
+            return værdi
+
+        if callable(værdi):
+
+            @functools.wraps(værdi)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    resultat = værdi(*args, **kwargs)
+                except BaseException:
+                    self._metrics.registrer(
+                        navn, time.perf_counter() - start, fejl=True
+                    )
+                    raise
+                self._metrics.registrer(
+                    navn,
+                    time.perf_counter() - start,
+                    payload=_størrelse(resultat) + _størrelse(kwargs.get("fil")),
+                )
+                return resultat
+
+            return wrapper
+
+        if isinstance(
+            værdi, (str, bytes, int, float, bool, dict, list, tuple, type(None))
+        ):
+            return værdi
+
+        return InstrumenteretKlient(værdi, navn, self._metrics)
+
+
+metrics = Metrics()
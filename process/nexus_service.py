@@ -1,12 +1,21 @@
-import base64
+import hashlib
 
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
+from typing import Callable
 from kmd_nexus_client import NexusClientManager
 from kmd_nexus_client.tree_helpers import filter_by_path
 from kmd_nexus_client.utils import sanitize_cpr
 from xflow_client import ProcessClient, DocumentClient
 from automation_server_client import WorkItemError
-from process.config import get_excel_mapping
+from process.config import Regler, get_regler
+from process.dokumenter import BLOKSTØRRELSE, Dokument, dekod_base64, spool_bytes
+from process.cache import TTLCache
+from process.metrics import metrics
+from process.checkpoints import NØGLE as CHECKPOINTS, Checkpoints, kør_trin
+from process.prefetch import Forudhenter
+from process.dokumentindeks import DokumentIndeks
 
 
 class NexusService:
@@ -15,60 +24,108 @@ class NexusService:
         nexus_client: NexusClientManager,
         xflow_process_client: ProcessClient,
         xflow_document_client: DocumentClient,
+        samtidige_dokumenter: int = 4,
+        spool_grænse: int = BLOKSTØRRELSE,
+        opslag_ttl: float = 3600,
+        borger_ttl: float = 300,
+        forudhenter: Forudhenter | None = None,
+        dokumentindeks: DokumentIndeks | None = None,
     ):
         self.nexus = nexus_client
         self.xflow_process = xflow_process_client
         self.xflow_document = xflow_document_client
+        self.samtidige_dokumenter = samtidige_dokumenter
+        self.spool_grænse = spool_grænse
+        # Organisationer ændrer sig sjældent. Borgere og forløb kan ændres i
+        # Nexus undervejs og gemmes kort og højst én runde, se `glem_borgere`.
+        self._opslag = TTLCache(ttl=opslag_ttl)
+        self._borgere = TTLCache(ttl=borger_ttl)
+        self._nye_borgere: set = set()
+        self.forudhenter = forudhenter
+        self.dokumentindeks = dokumentindeks
+
+    def forvarm_cache(self, organisationer: list[str]) -> None:
+        """Slår organisationer op i Nexus én gang ved opstart, så items kan genbruge dem."""
+        for organisation_navn in organisationer:
+            if self._hent_organisation(organisation_navn) is None:
+                raise ValueError(
+                    f"Organisation '{organisation_navn}' ikke fundet i Nexus."
+                )
 
-    def _hent_sagsområde(self, hjælpemiddel: str) -> str | None:
-        regler = get_excel_mapping()
-        sagsområder = regler.get("XFlow - Nexus oversættelse", {})
-        hjælpemiddelstype = hjælpemiddel.strip()
-
-        if hjælpemiddelstype in sagsområder:
-            sagsområde = sagsområder[hjælpemiddelstype]
-        elif "Andet" in sagsområder:
-            sagsområde = sagsområder["Andet"]
-        else:
-            return None
+    def _hent_organisation(self, organisation_navn: str) -> dict | None:
+        return self._opslag.hent(
+            ("organisation", organisation_navn),
+            lambda: self.nexus.organisationer.hent_organisation_ved_navn(
+                organisation_navn
+            ),
+        )
 
-        return sagsområde
+    def _hent_sagsområde(
+        self, hjælpemiddel: str, regler: Regler | None = None
+    ) -> str | None:
+        return (regler or get_regler()).sagsområde(hjælpemiddel)
 
-    def _hent_ansvarlig_organisation(self, item_data: dict) -> str:
-        regler = get_excel_mapping()
-        hjælpemiddelstype = item_data["Hjælpemiddel"].split("-")[0].strip()
-        organisationer = regler.get("Opgaveansvarlig organisation", {})
+    def _hent_ansvarlig_organisation(
+        self, item_data: dict, regler: Regler | None = None
+    ) -> str:
+        organisation = (regler or get_regler()).ansvarlig_organisation(
+            item_data["Hjælpemiddel"]
+        )
 
-        if hjælpemiddelstype in organisationer:
-            organisation = organisationer[hjælpemiddelstype]
-        elif "Andet" in organisationer:
-            organisation = organisationer["Andet"]
-        else:
+        if organisation is None:
+            hjælpemiddelstype = item_data["Hjælpemiddel"].split("-")[0].strip()
             raise WorkItemError(
                 f"Opgaveansvarlig organisation for '{hjælpemiddelstype}' ikke fundet."
             )
 
         return organisation
 
+    @metrics.målt("hent_borger")
     def hent_borger(self, cpr: str) -> dict:
         cpr = sanitize_cpr(cpr)
+        return self._borgere.hent(("borger", cpr), lambda: self._slå_borger_op(cpr))
+
+    def _slå_borger_op(self, cpr: str) -> dict:
         borger = self.nexus.borgere.hent_borger(cpr)
+        ny = borger is None
 
-        if borger is None:
-            self.nexus.borgere.opret_borger(borger_cpr=cpr)
-            borger = self.nexus.borgere.hent_borger(cpr)
-        elif borger.get("patientStatus") == "DRAFT":
+        if ny:
+            # Oprettelsen returnerer normalt borgeren, så den ikke skal slås op igen.
+            borger = self.nexus.borgere.opret_borger(borger_cpr=cpr)
+            if not isinstance(borger, dict) or "id" not in borger:
+                borger = self.nexus.borgere.hent_borger(cpr)
+
+        if borger is not None and borger.get("patientStatus") == "DRAFT":
             borger = self.nexus.borgere.aktiver_borger_fra_kladde(borger)
 
         if borger is None:
             raise WorkItemError(f"Borger med CPR {cpr} kunne ikke oprettes i Nexus.")
 
+        if ny:
+            self._nye_borgere.add(borger["id"])
+
         return borger
 
+    def glem_borger(self, cpr: str) -> None:
+        """Fjerner borger og forløb for CPR fra cachen, fx efter en fejl."""
+        try:
+            cpr = sanitize_cpr(cpr)
+        except Exception:
+            # Et ugyldigt CPR er aldrig blevet slået op.
+            return
+
+        borger = self._borgere.glem(("borger", cpr))
+        if isinstance(borger, dict):
+            self._borgere.glem(("forløb", borger["id"]))
+
+    def glem_borgere(self) -> None:
+        """Tømmer borger- og forløbscachen, så en ny runde ser Nexus, som den er nu."""
+        self._borgere.ryd()
+        self._nye_borgere.clear()
+
+    @metrics.målt("tilføj_borger_til_organisation")
     def tilføj_borger_til_organisation(self, borger: dict, organisation_navn: str):
-        organisation = self.nexus.organisationer.hent_organisation_ved_navn(
-            organisation_navn
-        )
+        organisation = self._hent_organisation(organisation_navn)
 
         if organisation is None:
             raise WorkItemError(
@@ -79,13 +136,37 @@ class NexusService:
             borger=borger, organisation=organisation
         )
 
+    @metrics.målt("tilføj_forløb_til_borger")
     def tilføj_forløb_til_borger(self, borger: dict) -> dict:
+        return self._borgere.hent(
+            ("forløb", borger["id"]), lambda: self._find_eller_opret_forløb(borger)
+        )
+
+    def _find_eller_opret_forløb(self, borger: dict) -> dict:
+        # Findes forløbet allerede, springes oprettelsen og det ekstra træopslag
+        # over. En borger, der lige er oprettet, har ingen forløb.
+        if borger["id"] not in self._nye_borgere:
+            forløb = self._find_aktivt_forløb(borger)
+            if forløb is not None:
+                return forløb
+
         self.nexus.forløb.opret_forløb(
             borger=borger,
             grundforløb_navn="Ældre og sundhedsfagligt grundforløb",
             forløb_navn="Sag SOFF: Kropsbårne hjælpemidler",
         )
 
+        self._nye_borgere.discard(borger["id"])
+        forløb = self._find_aktivt_forløb(borger)
+
+        if forløb is None:
+            raise WorkItemError(
+                "Forløb 'Sag SOFF: Kropsbårne hjælpemidler' for borger kunne ikke hentes i Nexus."
+            )
+
+        return forløb
+
+    def _find_aktivt_forløb(self, borger: dict) -> dict | None:
         visning = self.nexus.borgere.hent_visning(borger)
         assert visning is not None
 
@@ -97,81 +178,189 @@ class NexusService:
             active_pathways_only=True,
         )
 
-        forløb = self.nexus.hent_fra_reference(forløb[0])
+        if not forløb:
+            return None
 
-        if forløb is None:
+        return self.nexus.hent_fra_reference(forløb[0])
+
+    def _hent_ansøgning_som_pdf(self, item_data: dict) -> Dokument:
+        pdf = self.xflow_process.create_process_pdf(item_data["ProcesId"])
+
+        if pdf is None:
             raise WorkItemError(
-                "Forløb 'Sag SOFF: Kropsbårne hjælpemidler' for borger kunne ikke hentes i Nexus."
+                f"Arbejdsgang med ID {item_data['ProcesId']} kunne ikke hentes som PDF fra Xflow."
             )
 
-        return forløb
+        hasher = hashlib.sha256()
+        return Dokument(
+            filnavn="ansøgning.pdf",
+            titel=f"{'Genansøgning' if item_data['Genansøgning'] else 'Ansøgning'} {item_data['Hjælpemiddel']}",
+            indholdstype="application/pdf",
+            fil=spool_bytes(pdf, self.spool_grænse, hasher),
+            størrelse=len(pdf),
+            sha256=hasher.hexdigest(),
+        )
 
-    def upload_arbejdsgang_og_vedhæftede_filer(
-        self, borger: dict, forløb: dict, item_data: dict
-    ):
+    def _hent_dokument(self, dokument_id: str) -> Dokument:
+        dokument_data = self.xflow_document.hent_dokument_med_metadata(dokument_id)
+
+        if dokument_data is None:
+            raise WorkItemError(
+                f"Dokument med ID {dokument_id} kunne ikke hentes fra Xflow."
+            )
+
+        byte_array_b64 = dokument_data.pop("byteArray", None)
+        if byte_array_b64 is None:
+            raise WorkItemError(f"Dokument med ID {dokument_id} indeholder ingen data.")
+
+        hasher = hashlib.sha256()
         try:
-            arbejdsgang_som_pdf = self.xflow_process.create_process_pdf(
-                item_data["ProcesId"]
+            fil = dekod_base64(byte_array_b64, self.spool_grænse, hasher)
+        except Exception as decode_err:
+            raise WorkItemError(
+                f"Fejl ved base64-dekodning af dokument med ID {dokument_id}: {decode_err}"
             )
 
-            if arbejdsgang_som_pdf is None:
-                raise WorkItemError(
-                    f"Arbejdsgang med ID {item_data['ProcesId']} kunne ikke hentes som PDF fra Xflow."
-                )
+        return Dokument(
+            filnavn=f"{dokument_data['filename']}",
+            titel=dokument_data["filename"],
+            indholdstype=dokument_data["contentType"],
+            fil=fil,
+            størrelse=len(byte_array_b64) * 3 // 4,
+            sha256=hasher.hexdigest(),
+        )
 
-            self.nexus.forløb.opret_dokument(
-                borger=borger,
-                forløb=forløb,
-                fil=arbejdsgang_som_pdf,
-                filnavn="ansøgning.pdf",
-                titel=f"{'Genansøgning' if item_data['Genansøgning'] else 'Ansøgning'} {item_data['Hjælpemiddel']}",
-                noter="",
-                modtaget=datetime.now(),
-                indholdstype="application/pdf",
+    def _dokumenter_til_upload(
+        self, item_data: dict
+    ) -> list[tuple[str, str | None, Callable[[], Dokument]]]:
+        """Checkpoint-trin, XFlow-ID og indlæsning for dokumenter, der ikke er uploadet."""
+        udførte = item_data.get(CHECKPOINTS) or {}
+        dokumenter = [
+            (
+                "upload:ansøgning.pdf",
+                None,
+                lambda: self._hent_ansøgning_som_pdf(item_data),
+            )
+        ] + [
+            (
+                f"upload:{dokument_id}",
+                dokument_id,
+                partial(self._hent_dokument, dokument_id),
             )
+            for dokument_id in item_data["DokumentIds"]
+        ]
+        return [dokument for dokument in dokumenter if dokument[0] not in udførte]
 
-            for dokument_id in item_data["DokumentIds"]:
-                dokument_data = self.xflow_document.hent_dokument_med_metadata(
-                    dokument_id
-                )
+    def forudhent(self, item_data: dict) -> None:
+        """Begynder at hente itemets PDF og vedhæftede filer i baggrunden."""
+        if self.forudhenter is None:
+            return
+
+        for trin, _, indlæs in self._dokumenter_til_upload(item_data):
+            self.forudhenter.tilføj((f"{item_data['ProcesId']}", trin), indlæs)
+
+    def kassér_forudhentet(self, item_data: dict) -> None:
+        if self.forudhenter is not None:
+            proces_id = f"{item_data['ProcesId']}"
+            self.forudhenter.kassér(lambda nøgle: nøgle[0] == proces_id)
 
-                if dokument_data is None:
-                    raise WorkItemError(
-                        f"Dokument med ID {dokument_id} kunne ikke hentes fra Xflow."
-                    )
-
-                byte_array_b64 = dokument_data.get("byteArray")
-                if byte_array_b64 is not None:
-                    try:
-                        byte_array = base64.b64decode(byte_array_b64)
-                    except Exception as decode_err:
-                        raise WorkItemError(
-                            f"Fejl ved base64-dekodning af dokument med ID {dokument_id}: {decode_err}"
+    @metrics.målt("upload_arbejdsgang_og_vedhæftede_filer")
+    def upload_arbejdsgang_og_vedhæftede_filer(
+        self,
+        borger: dict,
+        forløb: dict,
+        item_data: dict,
+        checkpoints: Checkpoints | None = None,
+    ):
+        # PDF-rendering og hentning af vedhæftede filer startes samtidigt, mens
+        # upload til Nexus sker i den oprindelige rækkefølge. Indholdet spooles
+        # blokvis og sendes videre som filer, så hele dokumenter ikke ligger i
+        # hukommelsen. Forudhentede dokumenter bruges direkte, og dokumenter,
+        # der allerede er uploadet i et tidligere forsøg, hentes ikke igen.
+        # Dokumenter, hvis indhold allerede ligger på forløbet, uploades ikke
+        # igen, og kendte XFlow-dokumenter hentes slet ikke.
+        executor = ThreadPoolExecutor(max_workers=self.samtidige_dokumenter)
+        dokumenter = []
+
+        def hent(trin: str, indlæs: Callable[[], Dokument]) -> Future:
+            if self.forudhenter is not None:
+                fremtid = self.forudhenter.tag((f"{item_data['ProcesId']}", trin))
+                if fremtid is not None:
+                    return fremtid
+            return executor.submit(indlæs)
+
+        def udført(trin: str) -> bool:
+            return checkpoints is not None and checkpoints.er_udført(trin)
+
+        try:
+            for trin, xflow_id, indlæs in self._dokumenter_til_upload(item_data):
+                if udført(trin):
+                    continue
+                if self.dokumentindeks is not None and xflow_id is not None:
+                    if self.dokumentindeks.kender_xflow_dokument(
+                        borger, forløb, xflow_id
+                    ):
+                        metrics.tæl("dokument_sprunget_over")
+                        if checkpoints is not None:
+                            checkpoints.marker(trin)
+                        continue
+                dokumenter.append((trin, xflow_id, hent(trin, indlæs)))
+
+            while dokumenter:
+                trin, xflow_id, dokument = dokumenter.pop(0)
+
+                with dokument.result() as dokument:
+                    if (
+                        self.dokumentindeks is not None
+                        and self.dokumentindeks.er_uploadet(
+                            borger, forløb, dokument.sha256, dokument.filnavn
+                        )
+                    ):
+                        metrics.tæl("dokument_sprunget_over")
+                    else:
+                        self.nexus.forløb.opret_dokument(
+                            borger=borger,
+                            forløb=forløb,
+                            fil=dokument.fil,
+                            filnavn=dokument.filnavn,
+                            titel=dokument.titel,
+                            noter="",
+                            modtaget=datetime.now(),
+                            indholdstype=dokument.indholdstype,
                         )
 
-                if byte_array is None:
-                    raise WorkItemError(
-                        f"Dokument med ID {dokument_id} indeholder ingen data."
-                    )
-
-                self.nexus.forløb.opret_dokument(
-                    borger=borger,
-                    forløb=forløb,
-                    fil=byte_array,
-                    filnavn=f"{dokument_data['filename']}",
-                    titel=dokument_data["filename"],
-                    noter="",
-                    modtaget=datetime.now(),
-                    indholdstype=dokument_data["contentType"],
-                )
+                    if self.dokumentindeks is not None:
+                        self.dokumentindeks.registrer(
+                            borger,
+                            forløb,
+                            dokument.sha256,
+                            dokument.filnavn,
+                            xflow_id=xflow_id,
+                            størrelse=dokument.størrelse,
+                        )
+
+                if checkpoints is not None:
+                    checkpoints.marker(trin)
         except Exception as e:
             raise WorkItemError(
                 f"Fejl ved upload af arbejdsgang og vedhæftede filer til borger i Nexus: {e}"
             )
-
-    def opret_henvendelsesskema_og_opgave(self, borger: dict, item_data: dict) -> None:
-        ansvarlig_organisation = self._hent_ansvarlig_organisation(item_data)
-        sagsområde = self._hent_sagsområde(item_data["Hjælpemiddel"])
+        finally:
+            for *_, dokument in dokumenter:
+                if not dokument.cancel() and dokument.exception() is None:
+                    dokument.result().close()
+            executor.shutdown(wait=False)
+
+    @metrics.målt("opret_henvendelsesskema_og_opgave")
+    def opret_henvendelsesskema_og_opgave(
+        self,
+        borger: dict,
+        item_data: dict,
+        regler: Regler | None = None,
+        checkpoints: Checkpoints | None = None,
+    ) -> None:
+        ansvarlig_organisation = self._hent_ansvarlig_organisation(item_data, regler)
+        sagsområde = self._hent_sagsområde(item_data["Hjælpemiddel"], regler)
 
         if sagsområde is None:
             raise WorkItemError("Kan ikke finde tilsvarende sagsområde tag i Nexus.")
@@ -184,30 +373,47 @@ class NexusService:
             "Henvendelsesårsag": f"{'Genansøgning' if item_data['Genansøgning'] else 'Ansøgning'} - {item_data['Hjælpemiddel']}{' - Vedhæftede filer' if len(item_data['DokumentIds']) > 0 else ''}",
         }
 
-        skema = self.nexus.skemaer.opret_komplet_skema(
-            borger=borger,
-            skematype_navn="Henvendelse - Kropsbårne hjælpemidler",
-            handling_navn="Udfyldt",
-            data=skema_data,
-            tag_navn=sagsområde,
-            grundforløb="Ældre og sundhedsfagligt grundforløb",
-            forløb="Sag SOFF: Kropsbårne hjælpemidler",
-        )
+        def opret_skema():
+            skema = self.nexus.skemaer.opret_komplet_skema(
+                borger=borger,
+                skematype_navn="Henvendelse - Kropsbårne hjælpemidler",
+                handling_navn="Udfyldt",
+                data=skema_data,
+                tag_navn=sagsområde,
+                grundforløb="Ældre og sundhedsfagligt grundforløb",
+                forløb="Sag SOFF: Kropsbårne hjælpemidler",
+            )
+
+            if skema is None:
+                raise WorkItemError("Henvendelsesskema kunne ikke oprettes i Nexus.")
 
-        if skema is None:
-            raise WorkItemError("Henvendelsesskema kunne ikke oprettes i Nexus.")
+            return skema
+
+        skema = kør_trin(checkpoints, "henvendelsesskema", opret_skema)
 
         # Funny dato format for opgaver pga. underlige arbejdsvaner.
-        self.nexus.opgaver.opret_opgave(
-            objekt=skema,
-            opgave_type="Myndighed Kropsbårne hjælpemidler - uden opgavefrist",
-            titel=f"{datetime.now().strftime('%y%m%d')} - {'Genansøgning' if item_data['Genansøgning'] else 'Ansøgning'} - {item_data['Hjælpemiddel']}",
-            ansvarlig_organisation=ansvarlig_organisation,
-            start_dato=datetime.now(),
+        kør_trin(
+            checkpoints,
+            "opgave",
+            lambda: self.nexus.opgaver.opret_opgave(
+                objekt=skema,
+                opgave_type="Myndighed Kropsbårne hjælpemidler - uden opgavefrist",
+                titel=f"{datetime.now().strftime('%y%m%d')} - {'Genansøgning' if item_data['Genansøgning'] else 'Ansøgning'} - {item_data['Hjælpemiddel']}",
+                ansvarlig_organisation=ansvarlig_organisation,
+                start_dato=datetime.now(),
+            ),
+            gem_resultat=False,
         )
 
-    def opret_sagsnotat_og_sagsbehandling(self, borger: dict, item_data: dict) -> None:
-        sagsområde = self._hent_sagsområde(item_data["Hjælpemiddel"])
+    @metrics.målt("opret_sagsnotat")
+    def opret_sagsnotat(
+        self,
+        borger: dict,
+        item_data: dict,
+        regler: Regler | None = None,
+        checkpoints: Checkpoints | None = None,
+    ) -> None:
+        sagsområde = self._hent_sagsområde(item_data["Hjælpemiddel"], regler)
 
         if sagsområde is None:
             raise WorkItemError("Kan ikke finde tilsvarende sagsområde tag i Nexus.")
@@ -217,27 +423,50 @@ class NexusService:
             "Tekst": f"{datetime.now().strftime('%d%m%y')} {'Genansøgning' if item_data['Genansøgning'] else 'Ansøgning'} - {item_data['Hjælpemiddel']}",
         }
 
-        self.nexus.skemaer.opret_komplet_skema(
-            borger=borger,
-            skematype_navn="Sagsnotat - NY",
-            handling_navn="Udfyldt",
-            data=sagsnotat_data,
-            tag_navn=sagsområde,
-            grundforløb="Ældre og sundhedsfagligt grundforløb",
-            forløb="Sag SOFF: Kropsbårne hjælpemidler",
+        kør_trin(
+            checkpoints,
+            "sagsnotat",
+            lambda: self.nexus.skemaer.opret_komplet_skema(
+                borger=borger,
+                skematype_navn="Sagsnotat - NY",
+                handling_navn="Udfyldt",
+                data=sagsnotat_data,
+                tag_navn=sagsområde,
+                grundforløb="Ældre og sundhedsfagligt grundforløb",
+                forløb="Sag SOFF: Kropsbårne hjælpemidler",
+            ),
+            gem_resultat=False,
         )
 
+    @metrics.målt("opret_sagsbehandling")
+    def opret_sagsbehandling(
+        self,
+        borger: dict,
+        item_data: dict,
+        regler: Regler | None = None,
+        checkpoints: Checkpoints | None = None,
+    ) -> None:
+        sagsområde = self._hent_sagsområde(item_data["Hjælpemiddel"], regler)
+
+        if sagsområde is None:
+            raise WorkItemError("Kan ikke finde tilsvarende sagsområde tag i Nexus.")
+
         sagsbehandling_data = {
             "Ansøgning modtaget": datetime.now(),
             "Vurdering": f"{datetime.now().strftime('%d%m%y')} {'Genansøgning' if item_data['Genansøgning'] else 'Ansøgning'} - {item_data['Hjælpemiddel']}",
         }
 
-        self.nexus.skemaer.opret_komplet_skema(
-            borger=borger,
-            skematype_navn="Kropsbårne hjælpemidler sagsbehandling",
-            handling_navn="Udfyldt",
-            data=sagsbehandling_data,
-            tag_navn=sagsområde,
-            grundforløb="Ældre og sundhedsfagligt grundforløb",
-            forløb="Sag SOFF: Kropsbårne hjælpemidler",
+        kør_trin(
+            checkpoints,
+            "sagsbehandling",
+            lambda: self.nexus.skemaer.opret_komplet_skema(
+                borger=borger,
+                skematype_navn="Kropsbårne hjælpemidler sagsbehandling",
+                handling_navn="Udfyldt",
+                data=sagsbehandling_data,
+                tag_navn=sagsområde,
+                grundforløb="Ældre og sundhedsfagligt grundforløb",
+                forløb="Sag SOFF: Kropsbårne hjælpemidler",
+            ),
+            gem_resultat=False,
         )
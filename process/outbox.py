@@ -0,0 +1,204 @@
+import logging
+import os
+import sqlite3
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime, timedelta
+from typing import Callable
+from xflow_client import ProcessClient
+from process.xflow_service import XFlowService
+
+logger = logging.getLogger(__name__)
+
+AFVENTER = "afventer"
+OPDATERET = "opdateret"
+AFSLUTTET = "afsluttet"
+FEJLET = "fejlet"
+
+
+class XFlowOutbox:
+    """Persistent udbakke for opdatering og avancering af arbejdsgange i XFlow.
+
+    Items registrerer deres tilbagemelding her og er færdige, så snart den er
+    gemt. En baggrundstråd sender tilbagemeldingerne med samtidighed og retry,
+    og da udbakken ligger i SQLite, overlever de et nedbrud. Tilbagemeldinger,
+    der stadig fejler efter `maks_forsøg`, vises i afstemningsrapporten.
+
+    XFlow-servicen og -klienten hentes først, når der sendes, så rapporten kan
+    laves uden netværk og credentials.
+    """
+
+    def __init__(
+        self,
+        sti: str,
+        hent_xflow_service: Callable[[], XFlowService],
+        hent_process_client: Callable[[], ProcessClient],
+        samtidige: int = 4,
+        maks_forsøg: int = 6,
+        interval: float = 5,
+    ):
+        self.sti = sti
+        self.hent_xflow_service = hent_xflow_service
+        self.hent_process_client = hent_process_client
+        self.samtidige = samtidige
+        self.maks_forsøg = maks_forsøg
+        self.interval = interval
+        self._lås = threading.Lock()
+        self._vækning = threading.Event()
+        self._stop = threading.Event()
+        self._tråd: threading.Thread | None = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(sti)), exist_ok=True)
+        with closing(self._forbindelse()) as db:
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outbox (
+                    proces_id TEXT PRIMARY KEY,
+                    succes INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    forsøg INTEGER NOT NULL DEFAULT 0,
+                    næste_forsøg TEXT NOT NULL,
+                    fejl TEXT,
+                    oprettet TEXT NOT NULL,
+                    ændret TEXT NOT NULL
+                )
+                """
+            )
+
+    def _forbindelse(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.sti, timeout=30, isolation_level=None)
+
+    def _udfør(self, sql: str, parametre: tuple = ()) -> list[tuple]:
+        with self._lås, closing(self._forbindelse()) as db:
+            return db.execute(sql, parametre).fetchall()
+
+    def tilføj(self, item_data: dict, succes: bool) -> None:
+        nu = datetime.now().isoformat()
+        self._udfør(
+            """
+            INSERT INTO outbox
+                (proces_id, succes, status, næste_forsøg, oprettet, ændret)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (proces_id) DO UPDATE SET
+                succes = excluded.succes, status = excluded.status, forsøg = 0,
+                næste_forsøg = excluded.næste_forsøg, fejl = NULL,
+                ændret = excluded.ændret
+            """,
+            (f"{item_data['ProcesId']}", int(succes), AFVENTER, nu, nu, nu),
+        )
+        self._vækning.set()
+
+    def _send(self, proces_id: str, succes: bool, status: str, forsøg: int) -> None:
+        item_data = {"ProcesId": proces_id}
+
+        try:
+            xflow_service = self.hent_xflow_service()
+            xflow_process_client = self.hent_process_client()
+
+            if status == AFVENTER:
+                xflow_service.opdater_arbejdsgang(
+                    item_data, succes, xflow_process_client
+                )
+                self._sæt_status(proces_id, OPDATERET, forsøg)
+
+            xflow_service.avancer_arbejdsgang(item_data, xflow_process_client)
+            self._sæt_status(proces_id, AFSLUTTET, forsøg)
+        except Exception as e:
+            forsøg += 1
+            if forsøg >= self.maks_forsøg:
+                logger.error(
+                    f"Tilbagemelding til XFlow for {proces_id} opgivet efter {forsøg} forsøg: {e}"
+                )
+                self._sæt_status(proces_id, FEJLET, forsøg, fejl=str(e))
+                return
+
+            ventetid = timedelta(seconds=min(10 * 2**forsøg, 1800))
+            self._udfør(
+                "UPDATE outbox SET forsøg = ?, næste_forsøg = ?, fejl = ?, ændret = ? "
+                "WHERE proces_id = ?",
+                (
+                    forsøg,
+                    (datetime.now() + ventetid).isoformat(),
+                    str(e),
+                    datetime.now().isoformat(),
+                    proces_id,
+                ),
+            )
+
+    def _sæt_status(
+        self, proces_id: str, status: str, forsøg: int, fejl: str | None = None
+    ) -> None:
+        self._udfør(
+            "UPDATE outbox SET status = ?, forsøg = ?, fejl = ?, ændret = ? "
+            "WHERE proces_id = ?",
+            (status, forsøg, fejl, datetime.now().isoformat(), proces_id),
+        )
+
+    def behandl_afventende(self, alle: bool = False) -> int:
+        """Sender de tilbagemeldinger, der er klar. Med `alle` ignoreres ventetiden."""
+        rækker = self._udfør(
+            "SELECT proces_id, succes, status, forsøg FROM outbox "
+            "WHERE status IN (?, ?) AND (? OR næste_forsøg <= ?)",
+            (AFVENTER, OPDATERET, int(alle), datetime.now().isoformat()),
+        )
+
+        if rækker:
+            with ThreadPoolExecutor(max_workers=self.samtidige) as executor:
+                list(
+                    executor.map(
+                        lambda r: self._send(r[0], bool(r[1]), r[2], r[3]), rækker
+                    )
+                )
+
+        return len(rækker)
+
+    def _kør(self):
+        while not self._stop.is_set():
+            self._vækning.wait(self.interval)
+            self._vækning.clear()
+            try:
+                self.behandl_afventende()
+            except Exception as e:
+                logger.error(f"Fejl i XFlow-udbakken: {e}")
+
+    def start(self):
+        self._tråd = threading.Thread(target=self._kør, name="XFlowOutbox", daemon=True)
+        self._tråd.start()
+
+    def stop(self):
+        """Stopper baggrundstråden og forsøger at sende alt, der stadig afventer."""
+        self._stop.set()
+        self._vækning.set()
+        if self._tråd is not None:
+            self._tråd.join()
+        self.behandl_afventende(alle=True)
+
+    def rapport(self) -> dict:
+        """Afstemningsrapport: antal pr. status samt de tilbagemeldinger, der er opgivet."""
+        antal = dict(self._udfør("SELECT status, COUNT(*) FROM outbox GROUP BY status"))
+        fejlede = [
+            {
+                "ProcesId": r[0],
+                "succes": bool(r[1]),
+                "forsøg": r[2],
+                "fejl": r[3],
+                "ændret": r[4],
+            }
+            for r in self._udfør(
+                "SELECT proces_id, succes, forsøg, fejl, ændret FROM outbox "
+                "WHERE status = ? ORDER BY ændret",
+                (FEJLET,),
+            )
+        ]
+        return {"antal": antal, "fejlede": fejlede}
+
+    def log_rapport(self, logger: logging.Logger = logger) -> None:
+        rapport = self.rapport()
+        logger.info(f"XFlow-udbakke: {rapport['antal']}")
+        for fejlet in rapport["fejlede"]:
+            logger.warning(
+                f"XFlow-tilbagemelding for {fejlet['ProcesId']} "
+                f"(succes={fejlet['succes']}) fejlede efter {fejlet['forsøg']} forsøg: {fejlet['fejl']}"
+            )
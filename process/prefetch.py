@@ -0,0 +1,86 @@
+import logging
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Hashable
+from process.dokumenter import Dokument
+
+logger = logging.getLogger(__name__)
+
+
+def _luk(fremtid: Future) -> None:
+    if not fremtid.cancelled() and fremtid.exception() is None:
+        fremtid.result().close()
+
+
+class Forudhenter:
+    """Begrænset buffer af dokumenter, der hentes i baggrunden før de skal bruges.
+
+    Dokumenterne ligger i spoolede filer og fylder højst `maks_bytes` i alt.
+    Bliver bufferen fuld, smides de ældste færdige dokumenter ud og hentes i
+    stedet igen, når de skal bruges.
+    """
+
+    def __init__(self, samtidige: int = 2, maks_bytes: int = 256 * 1024 * 1024):
+        self.maks_bytes = maks_bytes
+        self._executor = ThreadPoolExecutor(
+            max_workers=samtidige, thread_name_prefix="Forudhenter"
+        )
+        self._lås = threading.Lock()
+        self._poster: dict[Hashable, Future] = {}
+        self._størrelser: dict[Hashable, int] = {}
+        self._bytes = 0
+
+    def tilføj(self, nøgle: Hashable, indlæs: Callable[[], Dokument]) -> None:
+        with self._lås:
+            if nøgle in self._poster:
+                return
+            fremtid = self._executor.submit(indlæs)
+            self._poster[nøgle] = fremtid
+
+        fremtid.add_done_callback(lambda f: self._færdig(nøgle, f))
+
+    def _færdig(self, nøgle: Hashable, fremtid: Future) -> None:
+        if fremtid.cancelled() or fremtid.exception() is not None:
+            return
+
+        udsmidte = []
+        with self._lås:
+            # Er dokumentet allerede taget eller kasseret, tæller det ikke med.
+            if self._poster.get(nøgle) is not fremtid:
+                return
+
+            self._størrelser[nøgle] = fremtid.result().størrelse
+            self._bytes += self._størrelser[nøgle]
+
+            while self._bytes > self.maks_bytes and self._størrelser:
+                ældste = next(iter(self._størrelser))
+                self._bytes -= self._størrelser.pop(ældste)
+                udsmidte.append(self._poster.pop(ældste))
+
+        if udsmidte:
+            logger.info(f"Forudhentning: smider {len(udsmidte)} dokument(er) ud")
+        for udsmidt in udsmidte:
+            _luk(udsmidt)
+
+    def tag(self, nøgle: Hashable) -> Future | None:
+        """Overtager et forudhentet (eller igangværende) dokument. Kalderen lukker det."""
+        with self._lås:
+            self._bytes -= self._størrelser.pop(nøgle, 0)
+            return self._poster.pop(nøgle, None)
+
+    def kassér(self, hører_til: Callable[[Hashable], bool]) -> None:
+        """Kasserer de dokumenter, hvis nøgle `hører_til` accepterer."""
+        with self._lås:
+            nøgler = [nøgle for nøgle in self._poster if hører_til(nøgle)]
+            kasserede = [self._poster.pop(nøgle) for nøgle in nøgler]
+            for nøgle in nøgler:
+                self._bytes -= self._størrelser.pop(nøgle, 0)
+
+        for fremtid in kasserede:
+            if not fremtid.cancel():
+                fremtid.add_done_callback(_luk)
+
+    def stop(self) -> None:
+        self.kassér(lambda nøgle: True)
+        self._executor.shutdown(wait=True, cancel_futures=True)
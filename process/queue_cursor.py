@@ -0,0 +1,99 @@
+import json
+import os
+
+from datetime import datetime, time, timedelta
+
+
+class QueueCursor:
+    """High-water-mark for opfyldning af køen pr. processkabelon.
+
+    Gemmer tidspunktet for seneste gennemførte og seneste fulde opfyldning
+    samt de publicIds, der allerede er sat i kø, så næste kørsel kun skal
+    søge nye arbejdsgange frem og udtrække dem, den ikke kender.
+    """
+
+    def __init__(self, sti: str, skabelon_id: str):
+        self.sti = sti
+        self.skabelon_id = skabelon_id
+        self.senest_kørt: datetime | None = None
+        self.senest_fuld: datetime | None = None
+        self._sete: dict[str, str] = {}
+        self._indlæs()
+
+    def _indlæs(self):
+        if not os.path.isfile(self.sti):
+            return
+
+        with open(self.sti, encoding="utf-8") as f:
+            tilstand = json.load(f).get(self.skabelon_id, {})
+
+        if tilstand.get("senest_kørt"):
+            self.senest_kørt = datetime.fromisoformat(tilstand["senest_kørt"])
+        if tilstand.get("senest_fuld"):
+            self.senest_fuld = datetime.fromisoformat(tilstand["senest_fuld"])
+        self._sete = tilstand.get("sete", {})
+
+    def søgevindue(
+        self,
+        nu: datetime,
+        vindue: timedelta,
+        overlap: timedelta,
+        fuld_interval: timedelta,
+    ) -> tuple[datetime, bool]:
+        """Dato, der skal søges fra, og om søgningen dækker hele `vindue`.
+
+        Normalt søges kun fra seneste kørsel minus `overlap`. Da en arbejdsgang
+        kan nå RPAIntegration længe efter oprettelsen, søges hele vinduet
+        igennem, når der er gået `fuld_interval` siden seneste fulde søgning.
+        """
+        vindue_start = datetime.combine((nu - vindue).date(), time.min)
+
+        if (
+            self.senest_kørt is None
+            or self.senest_fuld is None
+            or nu - self.senest_fuld >= fuld_interval
+        ):
+            return vindue_start, True
+
+        søg_fra = datetime.combine((self.senest_kørt - overlap).date(), time.min)
+        return max(vindue_start, søg_fra), søg_fra <= vindue_start
+
+    def er_set(self, public_id: str) -> bool:
+        return public_id in self._sete
+
+    def marker_set(self, public_ids, tidspunkt: datetime):
+        for public_id in public_ids:
+            self._sete.setdefault(public_id, tidspunkt.isoformat())
+
+    def nulstil(self):
+        self.senest_kørt = None
+        self.senest_fuld = None
+        self._sete = {}
+
+    def gem(self, kørt: datetime, glem_før: datetime, fuld: bool = False):
+        """Gemmer cursoren atomisk og glemmer publicIds set før `glem_før`."""
+        self.senest_kørt = kørt
+        if fuld:
+            self.senest_fuld = kørt
+        self._sete = {
+            public_id: set_tidspunkt
+            for public_id, set_tidspunkt in self._sete.items()
+            if datetime.fromisoformat(set_tidspunkt) >= glem_før
+        }
+
+        tilstand = {}
+        if os.path.isfile(self.sti):
+            with open(self.sti, encoding="utf-8") as f:
+                tilstand = json.load(f)
+
+        tilstand[self.skabelon_id] = {
+            "senest_kørt": kørt.isoformat(),
+            "senest_fuld": self.senest_fuld.isoformat() if self.senest_fuld else None,
+            "sete": self._sete,
+        }
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.sti)), exist_ok=True)
+        midlertidig_sti = f"{self.sti}.tmp"
+        with open(midlertidig_sti, "w", encoding="utf-8") as f:
+            json.dump(tilstand, f, ensure_ascii=False, indent=2)
+        os.replace(midlertidig_sti, self.sti)
@@ -0,0 +1,173 @@
+import functools
+import logging
+import random
+import threading
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Læsekald, der trygt kan gentages ved midlertidige fejl.
+IDEMPOTENTE_KALD = frozenset(
+    {
+        "hent_borger",
+        "hent_visning",
+        "hent_referencer",
+        "hent_fra_reference",
+        "hent_organisation_ved_navn",
+        "hent_dokument_med_metadata",
+        "create_process_pdf",
+        "search_processes",
+        "search_processes_by_current_activity",
+    }
+)
+
+
+def _statuskode(fejl: BaseException) -> int | None:
+    if isinstance(fejl, httpx.HTTPStatusError):
+        return fejl.response.status_code
+    return None
+
+
+def er_throttling(fejl: BaseException) -> bool:
+    statuskode = _statuskode(fejl)
+    return statuskode is not None and (statuskode == 429 or statuskode >= 500)
+
+
+def er_midlertidig(fejl: BaseException) -> bool:
+    return er_throttling(fejl) or isinstance(
+        fejl, (httpx.TransportError, TimeoutError, ConnectionError)
+    )
+
+
+def _retry_after(fejl: BaseException) -> float | None:
+    if not isinstance(fejl, httpx.HTTPStatusError):
+        return None
+    try:
+        return float(fejl.response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+class AdaptivBegrænser:
+    """Token bucket pr. backend, hvis rate tilpasses de svar backenden giver.
+
+    Raten halveres ved 429/5xx og øges langsomt igen ved succes (AIMD), så
+    throughput holdes så højt som backenden tillader.
+    """
+
+    def __init__(
+        self,
+        navn: str,
+        rate: float = 10,
+        minimum: float = 0.5,
+        maksimum: float = 50,
+        øgning: float = 0.1,
+    ):
+        self.navn = navn
+        self.rate = rate
+        self.minimum = minimum
+        self.maksimum = maksimum
+        self.øgning = øgning
+        self._lås = threading.Lock()
+        self._tokens = 1.0
+        self._sidst = time.monotonic()
+
+    def sæt_rate(self, rate: float) -> None:
+        """Sætter startraten. Maksimum hæves, så raten ikke straks falder til det."""
+        with self._lås:
+            self.rate = rate
+            self.maksimum = max(self.maksimum, rate)
+
+    def vent(self) -> None:
+        while True:
+            with self._lås:
+                nu = time.monotonic()
+                self._tokens = min(
+                    max(1.0, self.rate), self._tokens + (nu - self._sidst) * self.rate
+                )
+                self._sidst = nu
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                ventetid = (1 - self._tokens) / self.rate
+
+            time.sleep(ventetid)
+
+    def registrer_succes(self) -> None:
+        with self._lås:
+            self.rate = min(self.maksimum, self.rate + self.øgning)
+
+    def registrer_throttling(self) -> None:
+        with self._lås:
+            ny_rate = max(self.minimum, self.rate / 2)
+            if ny_rate < self.rate:
+                logger.info(f"{self.navn}: sænker rate til {ny_rate:.2f} kald/s")
+            self.rate = ny_rate
+
+
+class BegrænsetKlient:
+    """Proxy, der sender alle metodekald på en klient gennem en `AdaptivBegrænser`.
+
+    Idempotente læsekald gentages med jitteret eksponentiel backoff ved
+    midlertidige fejl. Andre kald begrænses kun, da de ikke trygt kan gentages.
+    """
+
+    def __init__(
+        self,
+        klient,
+        begrænser: AdaptivBegrænser,
+        maks_forsøg: int = 5,
+        basis_ventetid: float = 0.5,
+    ):
+        self._klient = klient
+        self._begrænser = begrænser
+        self._maks_forsøg = maks_forsøg
+        self._basis_ventetid = basis_ventetid
+
+    def __getattr__(self, attribut: str):
+        værdi = getattr(self._klient, attribut)
+
+        if attribut.startswith("_"):
+            return værdi
+
+        if callable(værdi):
+            forsøg_i_alt = self._maks_forsøg if attribut in IDEMPOTENTE_KALD else 1
+
+            @functools.wraps(værdi)
+            def wrapper(*args, **kwargs):
+                for forsøg in range(1, forsøg_i_alt + 1):
+                    self._begrænser.vent()
+                    try:
+                        resultat = værdi(*args, **kwargs)
+                    except Exception as e:
+                        if er_throttling(e):
+                            self._begrænser.registrer_throttling()
+                        if forsøg == forsøg_i_alt or not er_midlertidig(e):
+                            raise
+
+                        ventetid = _retry_after(e) or self._basis_ventetid * 2 ** (
+                            forsøg - 1
+                        ) * random.uniform(0.5, 1.5)
+                        logger.info(
+                            f"{self._begrænser.navn}.{attribut} fejlede ({e}), "
+                            f"forsøg {forsøg}/{forsøg_i_alt}, venter {ventetid:.1f}s"
+                        )
+                        time.sleep(ventetid)
+                    else:
+                        self._begrænser.registrer_succes()
+                        return resultat
+
+            return wrapper
+
+        if isinstance(
+            værdi, (str, bytes, int, float, bool, dict, list, tuple, type(None))
+        ):
+            return værdi
+
+        return BegrænsetKlient(
+            værdi, self._begrænser, self._maks_forsøg, self._basis_ventetid
+        )
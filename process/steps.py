@@ -0,0 +1,89 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
+from typing import Callable, Iterable, Mapping
+
+
+@dataclass(frozen=True)
+class Trin:
+    """Et trin i behandlingen af et item.
+
+    `funktion` kaldes med resultaterne af de trin, den afhænger af, og dens
+    eget resultat gøres tilgængeligt for senere trin under `navn`.
+    """
+
+    navn: str
+    funktion: Callable[[Mapping[str, object]], object]
+    afhænger_af: tuple[str, ...] = ()
+
+
+def udelad(trin: Iterable[Trin], navne: Iterable[str]) -> list[Trin]:
+    """Fjerner de navngivne trin fra grafen og afhængigheder af dem."""
+    navne = set(navne)
+    return [
+        replace(t, afhænger_af=tuple(a for a in t.afhænger_af if a not in navne))
+        for t in trin
+        if t.navn not in navne
+    ]
+
+
+def kør_graf(
+    trin: Iterable[Trin],
+    samtidige: int = 4,
+    kendte: Mapping[str, object] | None = None,
+    fortsæt: Callable[[], bool] | None = None,
+) -> dict[str, object]:
+    """Kører trinnene parallelt, så hvert trin starter, når dets afhængigheder er færdige.
+
+    Trin med et resultat i `kendte` køres ikke. Fejler et trin, startes der
+    ikke flere, og den første fejl kastes videre, når de trin, der allerede
+    er i gang, er afsluttet. Det samme sker, hvis `fortsæt` svarer nej, før
+    nye trin startes.
+    """
+    resultater: dict[str, object] = dict(kendte or {})
+    ventende = {t.navn: t for t in trin if t.navn not in resultater}
+
+    for t in ventende.values():
+        for afhængighed in t.afhænger_af:
+            if afhængighed not in ventende and afhængighed not in resultater:
+                raise ValueError(
+                    f"Trin '{t.navn}' afhænger af ukendt trin '{afhængighed}'"
+                )
+
+    igangværende: dict[Future, str] = {}
+    fejl: Exception | None = None
+
+    with ThreadPoolExecutor(max_workers=samtidige) as executor:
+        while ventende or igangværende:
+            if fejl is None and ventende and fortsæt is not None and not fortsæt():
+                fejl = RuntimeError(
+                    f"Behandlingen er afbrudt før trinnene: {', '.join(ventende)}"
+                )
+
+            if fejl is None:
+                for navn, t in list(ventende.items()):
+                    if all(a in resultater for a in t.afhænger_af):
+                        del ventende[navn]
+                        igangværende[executor.submit(t.funktion, dict(resultater))] = (
+                            navn
+                        )
+
+            if not igangværende:
+                if fejl is None:
+                    raise ValueError(
+                        f"Cyklisk afhængighed mellem trin: {', '.join(ventende)}"
+                    )
+                break
+
+            færdige, _ = wait(igangværende, return_when=FIRST_COMPLETED)
+            for fremtid in færdige:
+                navn = igangværende.pop(fremtid)
+                try:
+                    resultater[navn] = fremtid.result()
+                except Exception as e:
+                    if fejl is None:
+                        fejl = e
+
+    if fejl is not None:
+        raise fejl
+
+    return resultater
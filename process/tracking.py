@@ -0,0 +1,115 @@
+import json
+import logging
+import os
+import threading
+
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class HukommelsesTracker:
+    """Tracker-stand-in, der kun tæller i hukommelsen. Til tests og lokale kørsler."""
+
+    def __init__(self):
+        self.opgaver: Counter[str] = Counter()
+
+    def track_task(self, process_name: str):
+        self.opgaver[process_name] += 1
+
+
+class BufferetTracker:
+    """Samler `track_task`-kald i hukommelsen og skriver dem samlet fra en baggrundstråd.
+
+    Der skrives, når `interval` sekunder er gået, eller når `maks_antal` kald er
+    samlet op. Kan tracking-databasen ikke nås, gemmes de uskrevne tællinger i
+    en lokal spill-fil, som indlæses og skrives ved næste start.
+
+    `Tracker` bruges kun via `track_task` for én opgave ad gangen, så hver
+    talt opgave er stadig ét kald til databasen. Det er kun tidspunktet, der
+    flyttes væk fra behandlingen af items.
+    """
+
+    def __init__(
+        self,
+        tracker,
+        spill_sti: str,
+        interval: float = 60,
+        maks_antal: int = 50,
+    ):
+        self.tracker = tracker
+        self.spill_sti = spill_sti
+        self.interval = interval
+        self.maks_antal = maks_antal
+        self._lås = threading.Lock()
+        self._skriv_lås = threading.Lock()
+        self._vækning = threading.Event()
+        self._stop = threading.Event()
+        self._tråd: threading.Thread | None = None
+        self._tællinger: Counter[str] = self._læs_spill()
+
+    def _læs_spill(self) -> Counter[str]:
+        try:
+            with open(self.spill_sti, encoding="utf-8") as f:
+                return Counter(json.load(f))
+        except FileNotFoundError:
+            return Counter()
+        except (OSError, ValueError) as e:
+            logger.error(f"Kunne ikke læse tracking spill-fil '{self.spill_sti}': {e}")
+            return Counter()
+
+    def _gem_spill(self, tællinger: Counter[str]):
+        if not tællinger:
+            if os.path.isfile(self.spill_sti):
+                os.remove(self.spill_sti)
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.spill_sti)), exist_ok=True)
+        midlertidig_sti = f"{self.spill_sti}.tmp"
+        with open(midlertidig_sti, "w", encoding="utf-8") as f:
+            json.dump(dict(tællinger), f, ensure_ascii=False)
+        os.replace(midlertidig_sti, self.spill_sti)
+
+    def track_task(self, process_name: str):
+        with self._lås:
+            self._tællinger[process_name] += 1
+            if self._tællinger.total() >= self.maks_antal:
+                self._vækning.set()
+
+    def flush(self) -> None:
+        """Skriver de opsamlede tællinger til trackeren med ét `track_task` pr. opgave."""
+        with self._skriv_lås:
+            with self._lås:
+                tællinger, self._tællinger = self._tællinger, Counter()
+
+            try:
+                for process_name in list(tællinger):
+                    while tællinger[process_name] > 0:
+                        self.tracker.track_task(process_name)
+                        tællinger[process_name] -= 1
+            except Exception as e:
+                logger.warning(f"Tracking-databasen kunne ikke nås: {e}")
+            finally:
+                with self._lås:
+                    self._tællinger.update(+tællinger)
+                    uskrevne = Counter(self._tællinger)
+                self._gem_spill(uskrevne)
+
+    def _kør(self):
+        while not self._stop.is_set():
+            self._vækning.wait(self.interval)
+            self._vækning.clear()
+            self.flush()
+
+    def start(self):
+        self._tråd = threading.Thread(
+            target=self._kør, name="BufferetTracker", daemon=True
+        )
+        self._tråd.start()
+
+    def stop(self):
+        self._stop.set()
+        self._vækning.set()
+        if self._tråd is not None:
+            self._tråd.join()
+        self.flush()
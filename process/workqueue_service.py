@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+from automation_server_client import Workqueue
+
+
+class WorkqueueService:
+    def __init__(self, workqueue: Workqueue, samtidige_kald: int = 8):
+        self.workqueue = workqueue
+        self.samtidige_kald = samtidige_kald
+        self._kendte_referencer: set[str] = set()
+
+    @property
+    def kendte_referencer(self) -> set[str]:
+        """Referencer, der vides at findes i køen."""
+        return set(self._kendte_referencer)
+
+    def filtrer_nye_referencer(self, referencer: list[str]) -> set[str]:
+        """Returnerer de referencer, der ikke allerede findes i køen.
+
+        Opslagene for en hel side laves samtidigt, og referencer der én gang er
+        fundet i køen huskes resten af kørslen.
+        """
+        ukendte = [
+            r for r in dict.fromkeys(referencer) if r not in self._kendte_referencer
+        ]
+
+        if not ukendte:
+            return set()
+
+        with ThreadPoolExecutor(max_workers=self.samtidige_kald) as executor:
+            eksisterende = executor.map(self.workqueue.get_item_by_reference, ukendte)
+
+            nye = set()
+            for reference, items in zip(ukendte, eksisterende):
+                if len(items) > 0:
+                    self._kendte_referencer.add(reference)
+                else:
+                    nye.add(reference)
+
+        return nye
+
+    def tilføj_items(self, kødata: list[dict]) -> None:
+        """Tilføjer en batch af items til køen med ProcesId som reference."""
+        if not kødata:
+            return
+
+        def tilføj(data: dict):
+            reference = f"{data['ProcesId']}"
+            self.workqueue.add_item(data=data, reference=reference)
+            self._kendte_referencer.add(reference)
+
+        with ThreadPoolExecutor(max_workers=self.samtidige_kald) as executor:
+            list(executor.map(tilføj, kødata))
@@ -1,7 +1,111 @@
+from dataclasses import dataclass
 from xflow_client import XFlowClient, ProcessClient
 from datetime import datetime
-from kmd_nexus_client.tree_helpers import (
-    filter_by_predicate,
+from typing import Iterator
+from process.metrics import metrics
+
+SAMLET_ANSØGNING = "Kropsbårne hjælpemidler - samlet ansøgning V3 - Værdiliste"
+PERSONOPLYSNINGER = "Kropsbårne hjælpemidler - Personoplysninger V2"
+ALLE_BLANKETTER = ""
+AKTIVITET = "currentActivityName"
+
+
+def _indekser(rod) -> dict[str, dict]:
+    """Bygger identifier -> element for alle elementer under `rod` i én gennemgang.
+
+    Ved gentagne identifiers vinder det første element i dokumentrækkefølge.
+    """
+    indeks: dict[str, dict] = {}
+    stak = [rod]
+
+    while stak:
+        node = stak.pop()
+        if isinstance(node, dict):
+            identifier = node.get("identifier")
+            if isinstance(identifier, str):
+                indeks.setdefault(identifier, node)
+            stak.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stak.extend(reversed(node))
+
+    return indeks
+
+
+def indekser_blanketter(blanketter: list[dict]) -> dict[str, dict[str, dict]]:
+    """Indekserer hver blanket efter blanketnavn samt alle blanketter under ALLE_BLANKETTER."""
+    indeks: dict[str, dict[str, dict]] = {ALLE_BLANKETTER: {}}
+
+    for blanket in blanketter:
+        blanket_indeks = _indekser(blanket)
+        indeks.setdefault(blanket["blanketnavn"], blanket_indeks)
+        for identifier, element in blanket_indeks.items():
+            indeks[ALLE_BLANKETTER].setdefault(identifier, element)
+
+    return indeks
+
+
+@dataclass(frozen=True)
+class Felt:
+    """Et felt i kødata: hvilken blanket, hvilke element-identifiers og hvilken værdi.
+
+    Med `gruppe` findes elementet kun blandt de direkte elementer i gruppens
+    første gentagelse.
+    """
+
+    blanket: str
+    identifiers: tuple[str, ...]
+    værdi_nøgle: str | None = None
+    standard: object = None
+    gruppe: str | None = None
+
+    def element(self, indeks: dict[str, dict[str, dict]]) -> dict | None:
+        """Det første element i dokumentrækkefølge med en af feltets identifiers."""
+        blanket_indeks = indeks.get(self.blanket, {})
+        if self.gruppe is not None:
+            return self._element_i_gruppe(blanket_indeks.get(self.gruppe))
+
+        fundne = [i for i in self.identifiers if i in blanket_indeks]
+
+        if len(fundne) > 1:
+            # Indekset er bygget i dokumentrækkefølge.
+            return next(e for i, e in blanket_indeks.items() if i in fundne)
+
+        return blanket_indeks[fundne[0]] if fundne else None
+
+    def _element_i_gruppe(self, gruppe: dict | None) -> dict | None:
+        gentagelser = gruppe.get("children") if gruppe is not None else None
+        if not isinstance(gentagelser, list) or not gentagelser:
+            return None
+
+        return next(
+            (
+                e
+                for e in gentagelser[0]
+                if isinstance(e, dict) and e.get("identifier") in self.identifiers
+            ),
+            None,
+        )
+
+    def værdier(self, indeks: dict[str, dict[str, dict]]) -> dict:
+        element = self.element(indeks)
+        return (element.get("values") or {}) if element is not None else {}
+
+    def værdi(self, indeks: dict[str, dict[str, dict]]):
+        return self.værdier(indeks).get(self.værdi_nøgle, self.standard)
+
+
+CPR = Felt(
+    PERSONOPLYSNINGER,
+    ("PersonoplysningerAnsoegerVedAndenPart", "PersonoplysningerAnsoegerSelv"),
+    "CprNummer",
+)
+GENANSØGNING = Felt(SAMLET_ANSØGNING, ("HarDuTidligereSoegt",), "YesSelected", "False")
+HJÆLPEMIDDEL = Felt(
+    ALLE_BLANKETTER, ("ElementVaerdilisteTypeHjaelpemiddel",), "Valgtetekst"
+)
+DOKUMENTFELTER = (
+    Felt(SAMLET_ANSØGNING, ("UploadBilag",), gruppe="BemærkningerOgVedhaeftFiler"),
+    Felt(PERSONOPLYSNINGER, ("UploadDokumentationVaerge",), gruppe="Dokumentation"),
 )
 
 
@@ -10,118 +114,73 @@ class XFlowService:
         self.xflow_client = xflow_client
         self.xflow_process_client = xflow_process_client
 
-    def tilfoej_dokument_id_paa_uploaded_dokumenter(
-        self, source, vedhaeftede_filer, felt_navn
-    ):
-        source_list = [
-            e
-            for e in source
-            if isinstance(e, dict) and e.get("identifier") == felt_navn
-        ]
-        vedhaeftede_filer_element = (
-            source_list[0].get("values", {}) if source_list else None
-        )
-        if vedhaeftede_filer_element is not None:
-            for key, value in vedhaeftede_filer_element.items():
-                if key.startswith("document") and self.xflow_client.is_non_empty(value):
-                    vedhaeftede_filer.append(value)
-
-    def hent_dataudtræk_til_kødata(self, arbejdsgang) -> dict | None:
-        try:
-            blanketter = arbejdsgang["blanketter"]
-
-            samlet_ansøgning = filter_by_predicate(
-                roots=blanketter,
-                predicate=lambda x: (
-                    x["blanketnavn"]
-                    == "Kropsbårne hjælpemidler - samlet ansøgning V3 - Værdiliste"
-                ),
-            )
-            person_oplysninger = filter_by_predicate(
-                roots=blanketter,
-                predicate=lambda x: (
-                    x["blanketnavn"] == "Kropsbårne hjælpemidler - Personoplysninger V2"
-                ),
-            )
-            filtreret_ansøgning = (
-                self.xflow_client.traverse_json_for_referable_elements(
-                    samlet_ansøgning[0]
-                )
-            )
-            filtreret_person_oplysninger = (
-                self.xflow_client.traverse_json_for_referable_elements(
-                    person_oplysninger[0]
+    def søg_arbejdsgange(self, query: dict, aktivitet: str) -> Iterator[list[dict]]:
+        """Søger arbejdsgange side for side, så store resultater ikke bliver afskåret.
+
+        Siderne hentes ufiltreret og filtreres på aktuel aktivitet her, så en
+        side uden relevante arbejdsgange ikke afslutter søgningen. Der stoppes,
+        når en side er kortere end de foregående, eller når den ikke bringer
+        nogen nye arbejdsgange, fx hvis XFlow ignorerer `startIndex`.
+        """
+        sete: set[str] = set()
+        side_størrelse = 0
+        start_index = query.get("startIndex", 0)
+
+        while True:
+            side = (
+                self.xflow_process_client.search_processes(
+                    query={**query, "startIndex": start_index}
                 )
+                or []
             )
+            public_ids = {f"{a['publicId']}" for a in side}
+            if not public_ids - sete:
+                return
 
-            hjælpemiddel = str(
-                self.xflow_process_client.find_process_element_value(
-                    arbejdsgang, "ElementVaerdilisteTypeHjaelpemiddel", "Valgtetekst"
+            if not any(AKTIVITET in a for a in side):
+                raise ValueError(
+                    f"Søgeresultatet fra XFlow indeholder ikke feltet '{AKTIVITET}'."
                 )
-            )
 
-            cpr = filter_by_predicate(
-                roots=person_oplysninger[0]["elementer"],
-                predicate=lambda x: (
-                    x.get("identifier")
-                    in (
-                        "PersonoplysningerAnsoegerVedAndenPart",
-                        "PersonoplysningerAnsoegerSelv",
-                    )
-                ),
-            )
-            cpr = cpr[0].get("values", {}).get("CprNummer") if cpr else None
-
-            genansøgning = (
-                next(
-                    (
-                        e.get("values", {}).get("YesSelected")
-                        for e in filtreret_ansøgning
-                        if e.get("identifier") == "HarDuTidligereSoegt"
-                    ),
-                    "False",
-                )
-                == "True"
-            )
+            nye = [
+                a
+                for a in side
+                if a.get(AKTIVITET) == aktivitet and f"{a['publicId']}" not in sete
+            ]
+            sete |= public_ids
+            if nye:
+                yield nye
 
-            vedhæftede_filer = []
+            # Den største side set indtil videre er XFlows sidestørrelse.
+            side_størrelse = max(side_størrelse, len(side))
+            if len(side) < side_størrelse:
+                return
 
-            bemærkninger_og_vedhæft_filer_list = [
-                e
-                for e in filtreret_ansøgning
-                if e.get("identifier") == "BemærkningerOgVedhaeftFiler"
-            ]
-            bemærkninger_og_vedhæft_filer = (
-                bemærkninger_og_vedhæft_filer_list[0].get("children", {})
-                if bemærkninger_og_vedhæft_filer_list
-                else None
-            )
-            if (
-                isinstance(bemærkninger_og_vedhæft_filer, list)
-                and len(bemærkninger_og_vedhæft_filer) > 0
-            ):
-                bemærkninger_og_vedhæft_filer = bemærkninger_og_vedhæft_filer[0]
-                self.tilfoej_dokument_id_paa_uploaded_dokumenter(
-                    bemærkninger_og_vedhæft_filer, vedhæftede_filer, "UploadBilag"
-                )
+            start_index += len(side)
 
-            dokumentation = [
-                e
-                for e in filtreret_person_oplysninger
-                if e.get("identifier") == "Dokumentation"
+    @metrics.målt("hent_dataudtræk_til_kødata")
+    def hent_dataudtræk_til_kødata(self, arbejdsgang) -> dict | None:
+        try:
+            indeks = indekser_blanketter(arbejdsgang["blanketter"])
+
+            if SAMLET_ANSØGNING not in indeks or PERSONOPLYSNINGER not in indeks:
+                return None
+
+            cpr = CPR.værdi(indeks)
+            hjælpemiddel = str(HJÆLPEMIDDEL.værdi(indeks))
+            genansøgning = GENANSØGNING.værdi(indeks) == "True"
+
+            vedhæftede_filer = [
+                værdi
+                for felt in DOKUMENTFELTER
+                for nøgle, værdi in felt.værdier(indeks).items()
+                if nøgle.startswith("document")
+                and self.xflow_client.is_non_empty(værdi)
             ]
-            dokumentation = (
-                dokumentation[0].get("children", {}) if dokumentation else None
-            )
-            if isinstance(dokumentation, list) and len(dokumentation) > 0:
-                dokumentation = dokumentation[0]
-                self.tilfoej_dokument_id_paa_uploaded_dokumenter(
-                    dokumentation, vedhæftede_filer, "UploadDokumentationVaerge"
-                )
 
             kødata = {
                 "Cpr": cpr,
-                "Genansøgning": genansøgning if genansøgning is not None else False,
+                "Genansøgning": genansøgning,
                 "Hjælpemiddel": hjælpemiddel,
                 "DokumentIds": vedhæftede_filer,
                 "ProcesId": arbejdsgang["publicId"],
@@ -132,7 +191,8 @@ class XFlowService:
         except Exception:
             return None
 
-    def opdater_og_avancer_arbejdsgang(
+    @metrics.målt("opdater_arbejdsgang")
+    def opdater_arbejdsgang(
         self, item_data: dict, succes: bool, xflow_process_client: ProcessClient
     ):
         blanket_data = {
@@ -156,4 +216,14 @@ class XFlowService:
         }
 
         xflow_process_client.update_process(item_data["ProcesId"], blanket_data)
+
+    @metrics.målt("avancer_arbejdsgang")
+    def avancer_arbejdsgang(self, item_data: dict, xflow_process_client: ProcessClient):
         xflow_process_client.advance_process(process_id=item_data["ProcesId"])
+
+    @metrics.målt("opdater_og_avancer_arbejdsgang")
+    def opdater_og_avancer_arbejdsgang(
+        self, item_data: dict, succes: bool, xflow_process_client: ProcessClient
+    ):
+        self.opdater_arbejdsgang(item_data, succes, xflow_process_client)
+        self.avancer_arbejdsgang(item_data, xflow_process_client)
@@ -0,0 +1,70 @@
+import unittest
+
+from process.checkpoints import NØGLE, Checkpoints, kør_trin
+
+
+class FakeItem:
+    """Work item, der gemmer sine data, som køen gør ved `update`."""
+
+    def __init__(self, data: dict):
+        self.data = data
+        self.opdateringer = 0
+
+    def update(self, data: dict):
+        self.data = data
+        self.opdateringer += 1
+
+
+class CheckpointsTest(unittest.TestCase):
+    def test_retry_genoptager_efter_udførte_trin(self):
+        item = FakeItem({"ProcesId": 1})
+        kald = []
+
+        def opret_forløb():
+            kald.append("forløb")
+            return {"id": 7}
+
+        def fejler():
+            raise RuntimeError("Nexus svarer ikke")
+
+        checkpoints = Checkpoints(item)
+        self.assertEqual(checkpoints.kør("forløb", opret_forløb), {"id": 7})
+        with self.assertRaises(RuntimeError):
+            checkpoints.kør("sagsnotat", fejler)
+
+        retry = Checkpoints(FakeItem(item.data))
+        self.assertEqual(retry.kør("forløb", opret_forløb), {"id": 7})
+        self.assertFalse(retry.er_udført("sagsnotat"))
+        self.assertEqual(retry.kør("sagsnotat", lambda: "notat"), "notat")
+
+        self.assertEqual(kald, ["forløb"])
+
+    def test_uden_gem_resultat_registreres_kun_trinnet(self):
+        item = FakeItem({})
+        Checkpoints(item).kør("organisation", lambda: {"stort": "svar"}, False)
+
+        self.assertEqual(item.data[NØGLE], {"organisation": None})
+        self.assertIsNone(Checkpoints(item).kør("organisation", lambda: 1 / 0))
+
+    def test_itemets_øvrige_data_bevares(self):
+        data = {"ProcesId": 1, "Cpr": "0101011234"}
+        item = FakeItem(data)
+
+        Checkpoints(item).marker("upload:ansøgning")
+
+        self.assertEqual(item.data["Cpr"], "0101011234")
+        self.assertEqual(item.data[NØGLE], {"upload:ansøgning": None})
+        self.assertNotIn(NØGLE, data)
+        self.assertEqual(item.opdateringer, 1)
+
+    def test_kør_trin_uden_checkpoints_kører_altid(self):
+        kald = []
+
+        for _ in range(2):
+            kør_trin(None, "forløb", lambda: kald.append("forløb"))
+
+        self.assertEqual(kald, ["forløb", "forløb"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import threading
+import time
+import unittest
+
+from process.concurrency import CprLåse
+
+
+class CprLåseTest(unittest.TestCase):
+    def test_samme_cpr_behandles_ikke_samtidigt(self):
+        låse = CprLåse()
+        samtidige = 0
+        højeste = 0
+        tæller_lås = threading.Lock()
+
+        def arbejde():
+            nonlocal samtidige, højeste
+            with låse.lås("0101011234"):
+                with tæller_lås:
+                    samtidige += 1
+                    højeste = max(højeste, samtidige)
+                time.sleep(0.01)
+                with tæller_lås:
+                    samtidige -= 1
+
+        tråde = [threading.Thread(target=arbejde) for _ in range(5)]
+        for tråd in tråde:
+            tråd.start()
+        for tråd in tråde:
+            tråd.join()
+
+        self.assertEqual(højeste, 1)
+
+    def test_forskellige_cpr_blokerer_ikke_hinanden(self):
+        låse = CprLåse()
+        barriere = threading.Barrier(2, timeout=5)
+
+        def arbejde(cpr):
+            with låse.lås(cpr):
+                barriere.wait()
+
+        tråde = [
+            threading.Thread(target=arbejde, args=(cpr,))
+            for cpr in ("0101011234", "0202022345")
+        ]
+        for tråd in tråde:
+            tråd.start()
+        for tråd in tråde:
+            tråd.join()
+
+        self.assertFalse(barriere.broken)
+
+    def test_låsen_er_reentrant_i_samme_tråd(self):
+        låse = CprLåse()
+
+        with låse.lås("0101011234"):
+            with låse.lås("0101011234"):
+                pass
+
+    def test_låse_ryddes_op_efter_brug(self):
+        låse = CprLåse()
+
+        with låse.lås("0101011234"):
+            self.assertIn("0101011234", låse._låse)
+
+        with self.assertRaises(RuntimeError):
+            with låse.lås("0202022345"):
+                raise RuntimeError()
+
+        self.assertEqual(låse._låse, {})
+        self.assertEqual(låse._brugere, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import json
+import os
+import tempfile
+import unittest
+
+from unittest import mock
+
+from process import config
+from process.config import (
+    ORGANISATIONER,
+    SNAPSHOT_VERSION,
+    SAGSOMRÅDER,
+    STANDARD_UDELADTE_TRIN,
+    UDELADTE_TRIN,
+    Regler,
+)
+
+MAPPING = {
+    SAGSOMRÅDER: {
+        "Paryk - Kunstigt hår": "Sag: Paryk",
+        "Andet": "Sag: Andet",
+    },
+    ORGANISATIONER: {
+        "Paryk": "Fysisk Funktionsnedsættelse",
+        "Andet": "Indgangen",
+    },
+}
+
+
+class ReglerTest(unittest.TestCase):
+    def test_opslag_normaliserer_mellemrum_og_store_bogstaver(self):
+        regler = Regler.fra_mapping(MAPPING)
+
+        self.assertEqual(regler.sagsområde("paryk  -  kunstigt HÅR"), "Sag: Paryk")
+        self.assertEqual(
+            regler.ansvarlig_organisation(" PARYK - Kunstigt hår"),
+            "Fysisk Funktionsnedsættelse",
+        )
+
+    def test_ukendt_hjælpemiddel_falder_tilbage_til_andet(self):
+        regler = Regler.fra_mapping(MAPPING)
+
+        self.assertEqual(regler.sagsområde("Brystprotese - Venstre"), "Sag: Andet")
+        self.assertEqual(
+            regler.ansvarlig_organisation("Brystprotese - Venstre"), "Indgangen"
+        )
+
+    def test_uden_fallback_gives_none(self):
+        regler = Regler.fra_mapping(
+            {
+                SAGSOMRÅDER: {"Paryk - Kunstigt hår": "Sag: Paryk"},
+                ORGANISATIONER: {"Paryk": "Fysisk Funktionsnedsættelse"},
+            }
+        )
+
+        self.assertIsNone(regler.sagsområde("Brystprotese - Venstre"))
+        self.assertIsNone(regler.ansvarlig_organisation("Brystprotese - Venstre"))
+
+    def test_tom_værdi_afvises(self):
+        for ark in (SAGSOMRÅDER, ORGANISATIONER):
+            mapping = {**MAPPING, ark: {**MAPPING[ark], "Paryk": "  "}}
+            with self.subTest(ark=ark), self.assertRaises(ValueError):
+                Regler.fra_mapping(mapping)
+
+    def test_udeladte_trin_fra_regnearket(self):
+        regler = Regler.fra_mapping(
+            {**MAPPING, UDELADTE_TRIN: {"Paryk": "Sagsnotat, ,Upload"}}
+        )
+
+        self.assertEqual(
+            regler.udeladte_trin_for("Paryk - Kunstigt hår"),
+            frozenset({"sagsnotat", "upload"}),
+        )
+        self.assertEqual(regler.udeladte_trin_for("Andet"), frozenset())
+
+    def test_standard_udeladte_trin_uden_arket(self):
+        regler = Regler.fra_mapping(MAPPING)
+
+        self.assertEqual(
+            regler.udeladte_trin_for("Andet - Noget"), STANDARD_UDELADTE_TRIN["andet"]
+        )
+        self.assertEqual(regler.udeladte_trin_for("Paryk"), frozenset())
+
+    def test_reglerne_kan_ikke_ændres(self):
+        regler = Regler.fra_mapping(MAPPING)
+
+        with self.assertRaises(TypeError):
+            regler.sagsområder["ny"] = "x"
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        mappe = tempfile.TemporaryDirectory()
+        self.addCleanup(mappe.cleanup)
+        self.sti = os.path.join(mappe.name, "Regler.xlsx")
+        self.snapshot_sti = f"{self.sti}.snapshot.json"
+        self.skriv(b"version 1")
+
+        læs = mock.patch.object(config, "_læs_regneark", return_value=MAPPING)
+        self.læs = læs.start()
+        self.addCleanup(læs.stop)
+
+    def skriv(self, indhold: bytes, mtime_ns: int = 1_000_000_000):
+        with open(self.sti, "wb") as f:
+            f.write(indhold)
+        os.utime(self.sti, ns=(mtime_ns, mtime_ns))
+
+    def indlæs(self):
+        return config._indlæs_med_snapshot(self.sti)
+
+    def test_uændret_fil_læses_fra_snapshot(self):
+        mapping, sha256 = self.indlæs()
+        self.assertEqual(self.indlæs(), (mapping, sha256))
+
+        self.assertEqual(self.læs.call_count, 1)
+        self.assertEqual(mapping, MAPPING)
+
+    def test_ny_mtime_med_samme_indhold_genbruger_snapshot(self):
+        _, sha256 = self.indlæs()
+        self.skriv(b"version 1", mtime_ns=2_000_000_000)
+
+        self.assertEqual(self.indlæs()[1], sha256)
+        self.assertEqual(self.læs.call_count, 1)
+
+        # Snapshottet har fået den nye mtime og bruges nu uden hash.
+        with mock.patch.object(config, "_filhash") as filhash:
+            self.indlæs()
+        filhash.assert_not_called()
+
+    def test_ændret_indhold_læses_forfra(self):
+        _, sha256 = self.indlæs()
+        self.skriv(b"version 2", mtime_ns=2_000_000_000)
+
+        self.assertNotEqual(self.indlæs()[1], sha256)
+        self.assertEqual(self.læs.call_count, 2)
+
+    def test_ændret_størrelse_med_samme_mtime_læses_forfra(self):
+        self.indlæs()
+        self.skriv(b"version 10")
+
+        self.indlæs()
+        self.assertEqual(self.læs.call_count, 2)
+
+    def test_snapshot_fra_anden_version_læses_forfra(self):
+        self.indlæs()
+        with open(self.snapshot_sti, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        snapshot["version"] = SNAPSHOT_VERSION - 1
+        with open(self.snapshot_sti, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+
+        self.indlæs()
+        self.assertEqual(self.læs.call_count, 2)
+
+    def test_ødelagt_snapshot_læses_forfra(self):
+        self.indlæs()
+        with open(self.snapshot_sti, "w", encoding="utf-8") as f:
+            f.write("{")
+
+        self.assertEqual(self.indlæs()[0], MAPPING)
+        self.assertEqual(self.læs.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import base64
+import hashlib
+import os
+import unittest
+
+from unittest import mock
+
+from process import dokumenter
+from process.dokumenter import dekod_base64, spool_bytes
+
+
+class DekodBase64Test(unittest.TestCase):
+    def test_blokgrænser(self):
+        for blokstørrelse in (4, 8, 12, 64):
+            for længde in (0, 1, 2, 3, 5, 47, 48, 100):
+                data = os.urandom(længde)
+                with self.subTest(blokstørrelse=blokstørrelse, længde=længde):
+                    with mock.patch.object(dokumenter, "BLOKSTØRRELSE", blokstørrelse):
+                        with dekod_base64(base64.b64encode(data).decode(), 16) as fil:
+                            self.assertEqual(fil.read(), data)
+
+    def test_linjeskift_over_blokgrænser(self):
+        data = os.urandom(200)
+        tekst = base64.encodebytes(data).decode()
+
+        for blokstørrelse in (4, 8, 76, 80):
+            with self.subTest(blokstørrelse=blokstørrelse):
+                with mock.patch.object(dokumenter, "BLOKSTØRRELSE", blokstørrelse):
+                    with dekod_base64(tekst, 1024) as fil:
+                        self.assertEqual(fil.read(), data)
+
+    def test_hasher_opdateres_med_indholdet(self):
+        data = os.urandom(100)
+        hasher = hashlib.sha256()
+
+        with mock.patch.object(dokumenter, "BLOKSTØRRELSE", 8):
+            dekod_base64(base64.b64encode(data).decode(), 16, hasher).close()
+
+        self.assertEqual(hasher.hexdigest(), hashlib.sha256(data).hexdigest())
+
+    def test_ugyldig_længde(self):
+        with self.assertRaisesRegex(ValueError, "længde"):
+            dekod_base64("QUJD" + "QQ", 16)
+
+    def test_ugyldige_tegn(self):
+        with self.assertRaises(ValueError):
+            dekod_base64("QU*D", 16)
+
+
+class SpoolBytesTest(unittest.TestCase):
+    def test_indhold(self):
+        data = os.urandom(100)
+
+        with mock.patch.object(dokumenter, "BLOKSTØRRELSE", 7):
+            with spool_bytes(data, 16) as fil:
+                self.assertEqual(fil.read(), data)
+
+    def test_hasher_opdateres_med_indholdet(self):
+        data = os.urandom(100)
+        hasher = hashlib.sha256()
+
+        with mock.patch.object(dokumenter, "BLOKSTØRRELSE", 7):
+            with spool_bytes(data, 16, hasher) as fil:
+                self.assertEqual(fil.read(), data)
+
+        self.assertEqual(hasher.hexdigest(), hashlib.sha256(data).hexdigest())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+from process.dokumentindeks import DokumentIndeks
+
+BORGER = {"id": 1}
+FORLØB = {"id": 2}
+
+
+class DokumentIndeksTest(unittest.TestCase):
+    def setUp(self):
+        mappe = tempfile.TemporaryDirectory()
+        self.addCleanup(mappe.cleanup)
+        self.sti = os.path.join(mappe.name, "dokumentindeks.sqlite")
+        self.indeks = DokumentIndeks(self.sti)
+
+    def test_uploadet_dokument_kendes_på_indhold_og_filnavn(self):
+        self.indeks.registrer(BORGER, FORLØB, "abc", "bilag.pdf", størrelse=10)
+
+        self.assertTrue(self.indeks.er_uploadet(BORGER, FORLØB, "abc", "bilag.pdf"))
+        self.assertFalse(self.indeks.er_uploadet(BORGER, FORLØB, "abc", "andet.pdf"))
+        self.assertFalse(self.indeks.er_uploadet(BORGER, FORLØB, "def", "bilag.pdf"))
+
+    def test_dokument_kendes_kun_på_samme_forløb(self):
+        self.indeks.registrer(BORGER, FORLØB, "abc", "bilag.pdf", xflow_id="x1")
+
+        self.assertFalse(self.indeks.er_uploadet(BORGER, {"id": 3}, "abc", "bilag.pdf"))
+        self.assertFalse(self.indeks.kender_xflow_dokument(BORGER, {"id": 3}, "x1"))
+        self.assertFalse(self.indeks.kender_xflow_dokument({"id": 4}, FORLØB, "x1"))
+
+    def test_xflow_dokument_kendes_kun_med_id(self):
+        self.indeks.registrer(BORGER, FORLØB, "abc", "ansøgning.pdf")
+        self.indeks.registrer(BORGER, FORLØB, "def", "bilag.pdf", xflow_id=5)
+
+        self.assertTrue(self.indeks.kender_xflow_dokument(BORGER, FORLØB, "5"))
+        self.assertFalse(self.indeks.kender_xflow_dokument(BORGER, FORLØB, "6"))
+
+    def test_gentagen_registrering_og_genåbning(self):
+        self.indeks.registrer(BORGER, FORLØB, "abc", "bilag.pdf", xflow_id="x1")
+        self.indeks.registrer(BORGER, FORLØB, "abc", "bilag.pdf", xflow_id="x1")
+
+        genåbnet = DokumentIndeks(self.sti)
+        self.assertTrue(genåbnet.er_uploadet(BORGER, FORLØB, "abc", "bilag.pdf"))
+        self.assertTrue(genåbnet.kender_xflow_dokument(BORGER, FORLØB, "x1"))
+        self.assertEqual(genåbnet._udfør("SELECT COUNT(*) FROM dokumenter")[0][0], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
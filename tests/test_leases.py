@@ -0,0 +1,233 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from process.leases import (
+    CprLeaser,
+    HukommelsesLeaseLager,
+    SqliteLeaseLager,
+    SqlServerLeaseLager,
+)
+
+
+class LeaseLagerTests:
+    """Fælles tests for lease-lagrene. `opret_lager` sættes af underklasserne."""
+
+    def test_kun_én_ejer_ad_gangen(self):
+        lager = self.opret_lager()
+
+        self.assertTrue(lager.prøv_at_tage("cpr:1", "a", 60))
+        self.assertFalse(lager.prøv_at_tage("cpr:1", "b", 60))
+        self.assertTrue(lager.prøv_at_tage("cpr:1", "a", 60))
+        self.assertTrue(lager.prøv_at_tage("cpr:2", "b", 60))
+
+    def test_udløbet_lease_overtages(self):
+        lager = self.opret_lager()
+
+        self.assertTrue(lager.prøv_at_tage("cpr:1", "a", 0.05))
+        time.sleep(0.1)
+
+        self.assertTrue(lager.prøv_at_tage("cpr:1", "b", 60))
+        self.assertFalse(lager.forny("cpr:1", "a", 60))
+        self.assertFalse(lager.prøv_at_tage("cpr:1", "a", 60))
+
+    def test_forny_forlænger_kun_egen_lease(self):
+        lager = self.opret_lager()
+
+        self.assertTrue(lager.prøv_at_tage("cpr:1", "a", 0.1))
+        self.assertFalse(lager.forny("cpr:1", "b", 60))
+        self.assertTrue(lager.forny("cpr:1", "a", 60))
+        time.sleep(0.15)
+
+        self.assertFalse(lager.prøv_at_tage("cpr:1", "b", 60))
+
+    def test_frigiv_kun_egen_lease(self):
+        lager = self.opret_lager()
+
+        lager.prøv_at_tage("cpr:1", "a", 60)
+        lager.frigiv("cpr:1", "b")
+        self.assertFalse(lager.prøv_at_tage("cpr:1", "b", 60))
+
+        lager.frigiv("cpr:1", "a")
+        self.assertTrue(lager.prøv_at_tage("cpr:1", "b", 60))
+
+
+class HukommelsesLeaseLagerTest(LeaseLagerTests, unittest.TestCase):
+    def opret_lager(self):
+        return HukommelsesLeaseLager()
+
+
+class SqliteLeaseLagerTest(LeaseLagerTests, unittest.TestCase):
+    def opret_lager(self):
+        mappe = tempfile.TemporaryDirectory()
+        self.addCleanup(mappe.cleanup)
+        return SqliteLeaseLager(os.path.join(mappe.name, "leases.sqlite"))
+
+    def test_netværksstier_afvises(self):
+        for sti in ("\\\\server\\del\\leases.sqlite", "//server/del/leases.sqlite"):
+            with self.subTest(sti=sti), self.assertRaises(ValueError):
+                SqliteLeaseLager(sti)
+
+
+@unittest.skipUnless(
+    os.environ.get("LEASE_TEST_SQL_SERVER"),
+    "LEASE_TEST_SQL_SERVER er ikke sat til server/database",
+)
+class SqlServerLeaseLagerTest(LeaseLagerTests, unittest.TestCase):
+    """Kører mod en rigtig SQL Server, fx
+    LEASE_TEST_SQL_SERVER=server/database LEASE_TEST_SQL_USER=... LEASE_TEST_SQL_PASSWORD=...
+    """
+
+    def opret_lager(self):
+        server, _, database = os.environ["LEASE_TEST_SQL_SERVER"].partition("/")
+        lager = SqlServerLeaseLager(
+            server,
+            database,
+            os.environ.get("LEASE_TEST_SQL_USER", ""),
+            os.environ.get("LEASE_TEST_SQL_PASSWORD", ""),
+            tabel=f"cpr_leases_test_{os.getpid()}",
+        )
+        self.addCleanup(lager._udfør, f"DROP TABLE {lager.tabel}")
+        return lager
+
+
+class SqlServerLeaseLagerTabelTest(unittest.TestCase):
+    def test_ugyldigt_tabelnavn_afvises(self):
+        with self.assertRaises(ValueError):
+            SqlServerLeaseLager("server", "db", "bruger", "kode", tabel="x; DROP")
+
+
+class CprLeaserTest(unittest.TestCase):
+    def test_lease_holdes_i_blokken_og_frigives_bagefter(self):
+        lager = HukommelsesLeaseLager()
+        leaser = CprLeaser(lager, "a")
+        nøgle = leaser.nøgle("0101011234")
+
+        with leaser.lås("0101011234"):
+            self.assertFalse(lager.prøv_at_tage(nøgle, "b", 60))
+
+        self.assertTrue(lager.prøv_at_tage(nøgle, "b", 60))
+
+    def test_lease_tælles_ved_indlejret_brug(self):
+        lager = HukommelsesLeaseLager()
+        leaser = CprLeaser(lager, "a")
+        nøgle = leaser.nøgle("0101011234")
+
+        with leaser.lås("0101011234"):
+            with leaser.lås("0101011234"):
+                pass
+            self.assertFalse(lager.prøv_at_tage(nøgle, "b", 60))
+
+        self.assertEqual(leaser._holdte, {})
+
+    def test_anden_instans_venter_på_lease(self):
+        lager = HukommelsesLeaseLager()
+        a = CprLeaser(lager, "a", ventetid=0.01)
+        b = CprLeaser(lager, "b", ventetid=0.01)
+        rækkefølge = []
+        taget = threading.Event()
+
+        def instans_b():
+            taget.wait(5)
+            with b.lås("0101011234"):
+                rækkefølge.append("b")
+
+        tråd = threading.Thread(target=instans_b)
+        tråd.start()
+
+        with a.lås("0101011234"):
+            taget.set()
+            time.sleep(0.05)
+            rækkefølge.append("a")
+
+        tråd.join(5)
+        self.assertEqual(rækkefølge, ["a", "b"])
+
+    def test_stoppet_instans_overtages_efter_varighed(self):
+        lager = HukommelsesLeaseLager()
+        a = CprLeaser(lager, "a", varighed=0.05)
+        b = CprLeaser(lager, "b", ventetid=0.01)
+
+        # Instansen "dør" med leasen: den frigives ikke og fornyes ikke.
+        self.assertTrue(lager.prøv_at_tage(a.nøgle("0101011234"), "a", a.varighed))
+
+        start = time.monotonic()
+        with b.lås("0101011234"):
+            pass
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    def test_forny_alle_holder_leasen_i_live(self):
+        lager = HukommelsesLeaseLager()
+        a = CprLeaser(lager, "a", varighed=0.1)
+        nøgle = a.nøgle("0101011234")
+
+        with a.lås("0101011234"):
+            time.sleep(0.06)
+            a.forny_alle()
+            time.sleep(0.06)
+            self.assertFalse(lager.prøv_at_tage(nøgle, "b", 60))
+
+    def test_holder_leasen_i_blokken(self):
+        a = CprLeaser(HukommelsesLeaseLager(), "a")
+
+        self.assertFalse(a.holder("0101011234"))
+        with a.lås("0101011234"):
+            self.assertTrue(a.holder("0101011234"))
+        self.assertFalse(a.holder("0101011234"))
+
+    def test_mistet_lease_holdes_ikke(self):
+        lager = HukommelsesLeaseLager()
+        a = CprLeaser(lager, "a", varighed=0.05)
+        nøgle = a.nøgle("0101011234")
+
+        with a.lås("0101011234"):
+            time.sleep(0.1)
+            self.assertTrue(lager.prøv_at_tage(nøgle, "b", 60))
+            a.forny_alle()
+
+            self.assertFalse(a.holder("0101011234"))
+            self.assertFalse(lager.forny(nøgle, "a", 60))
+
+    def test_lease_der_ikke_fornyes_holdes_ikke_efter_varighed(self):
+        a = CprLeaser(HukommelsesLeaseLager(), "a", varighed=0.05)
+
+        with a.lås("0101011234"):
+            time.sleep(0.1)
+            self.assertFalse(a.holder("0101011234"))
+
+    def test_mistet_lease_tages_ikke_igen_før_den_er_sluppet(self):
+        lager = HukommelsesLeaseLager()
+        a = CprLeaser(lager, "a", varighed=0.05, ventetid=0.01)
+        nøgle = a.nøgle("0101011234")
+        taget_igen = threading.Event()
+
+        def anden_worker():
+            with a.lås("0101011234"):
+                taget_igen.set()
+
+        with a.lås("0101011234"):
+            time.sleep(0.06)
+            self.assertTrue(lager.prøv_at_tage(nøgle, "b", 0.1))
+            a.forny_alle()
+
+            tråd = threading.Thread(target=anden_worker)
+            tråd.start()
+            self.assertFalse(taget_igen.wait(0.05))
+
+        tråd.join(5)
+        self.assertTrue(taget_igen.is_set())
+
+    def test_nøglen_indeholder_ikke_cpr(self):
+        leaser = CprLeaser(HukommelsesLeaseLager(), "a", partitioner=16)
+        nøgle = leaser.nøgle("0101011234")
+
+        self.assertNotIn("0101011234", nøgle)
+        self.assertEqual(nøgle, leaser.nøgle("0101011234"))
+        self.assertLess(int(nøgle.split(":")[1]), 16)
+
+
+if __name__ == "__main__":
+    unittest.main()
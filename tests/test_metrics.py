@@ -0,0 +1,40 @@
+import json
+import os
+import tempfile
+import unittest
+
+from process.metrics import Metrics
+
+
+class TællerTest(unittest.TestCase):
+    def test_tællere_påvirker_ikke_latenstal(self):
+        metrics = Metrics()
+        metrics.registrer("upload", 0.2)
+        metrics.tæl("dokument_sprunget_over")
+        metrics.tæl("dokument_sprunget_over", 2)
+
+        self.assertEqual(metrics.tællere(), {"dokument_sprunget_over": 3})
+        self.assertEqual(list(metrics.opsummering()), ["upload"])
+        self.assertEqual(metrics.opsummering()["upload"]["antal"], 1)
+
+    def test_tællere_eksporteres_og_nulstilles(self):
+        mappe = tempfile.TemporaryDirectory()
+        self.addCleanup(mappe.cleanup)
+        sti = os.path.join(mappe.name, "metrics.jsonl")
+        metrics = Metrics()
+        metrics.registrer("upload", 0.2)
+        metrics.tæl("dokument_sprunget_over")
+
+        metrics.eksporter_jsonl(sti)
+        metrics.nulstil()
+
+        with open(sti, encoding="utf-8") as f:
+            linjer = [json.loads(linje) for linje in f]
+        self.assertEqual([linje.get("trin") for linje in linjer], ["upload", None])
+        self.assertEqual(linjer[1]["tæller"], "dokument_sprunget_over")
+        self.assertEqual(linjer[1]["antal"], 1)
+        self.assertEqual(metrics.tællere(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+from process.nexus_service import NexusService
+
+
+class FakeBorgere:
+    def __init__(self):
+        self.opslag = 0
+
+    def hent_borger(self, cpr: str) -> dict:
+        self.opslag += 1
+        return {"id": cpr, "patientStatus": "ACTIVE"}
+
+
+class FakeOrganisationer:
+    def __init__(self):
+        self.opslag = 0
+
+    def hent_organisation_ved_navn(self, navn: str) -> dict:
+        self.opslag += 1
+        return {"navn": navn}
+
+
+class FakeNexus:
+    def __init__(self):
+        self.borgere = FakeBorgere()
+        self.organisationer = FakeOrganisationer()
+
+
+class BorgercacheTest(unittest.TestCase):
+    def setUp(self):
+        self.nexus = FakeNexus()
+        self.service = NexusService(self.nexus, None, None)
+
+    def test_borger_genbruges_inden_for_runden(self):
+        self.service.hent_borger("0101011234")
+        self.service.hent_borger("0101011234")
+
+        self.assertEqual(self.nexus.borgere.opslag, 1)
+
+    def test_ny_runde_slår_borgeren_op_igen(self):
+        self.service.hent_borger("0101011234")
+        self.service.glem_borgere()
+        self.service.hent_borger("0101011234")
+
+        self.assertEqual(self.nexus.borgere.opslag, 2)
+
+    def test_ny_runde_beholder_organisationer(self):
+        self.service.forvarm_cache(["Sundhed"])
+        self.service.glem_borgere()
+        self.service._hent_organisation("Sundhed")
+
+        self.assertEqual(self.nexus.organisationer.opslag, 1)
+
+    def test_borgere_udløber_før_organisationer(self):
+        service = NexusService(self.nexus, None, None, opslag_ttl=60, borger_ttl=0)
+        service.hent_borger("0101011234")
+        service.hent_borger("0101011234")
+        service.forvarm_cache(["Sundhed"])
+        service._hent_organisation("Sundhed")
+
+        self.assertEqual(self.nexus.borgere.opslag, 2)
+        self.assertEqual(self.nexus.organisationer.opslag, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
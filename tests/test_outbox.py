@@ -0,0 +1,159 @@
+import os
+import tempfile
+import unittest
+
+from process.outbox import AFSLUTTET, AFVENTER, FEJLET, OPDATERET, XFlowOutbox
+
+
+class FakeXFlowService:
+    """Registrerer tilbagemeldinger og fejler de første `fejl` kald pr. metode."""
+
+    def __init__(self, opdater_fejl: int = 0, avancer_fejl: int = 0):
+        self.fejl = {"opdater": opdater_fejl, "avancer": avancer_fejl}
+        self.opdateret: list[tuple[str, bool]] = []
+        self.avanceret: list[str] = []
+
+    def _måske_fejl(self, metode: str):
+        if self.fejl[metode] > 0:
+            self.fejl[metode] -= 1
+            raise RuntimeError(f"{metode} fejlede")
+
+    def opdater_arbejdsgang(self, item_data, succes, xflow_process_client):
+        self._måske_fejl("opdater")
+        self.opdateret.append((item_data["ProcesId"], succes))
+
+    def avancer_arbejdsgang(self, item_data, xflow_process_client):
+        self._måske_fejl("avancer")
+        self.avanceret.append(item_data["ProcesId"])
+
+
+class XFlowOutboxTest(unittest.TestCase):
+    def opret_outbox(self, service: FakeXFlowService, **kwargs) -> XFlowOutbox:
+        mappe = tempfile.TemporaryDirectory()
+        self.addCleanup(mappe.cleanup)
+        return XFlowOutbox(
+            os.path.join(mappe.name, "outbox.sqlite"),
+            hent_xflow_service=lambda: service,
+            hent_process_client=lambda: None,
+            **kwargs,
+        )
+
+    def status(self, outbox: XFlowOutbox, proces_id: str) -> str:
+        return outbox._udfør(
+            "SELECT status FROM outbox WHERE proces_id = ?", (proces_id,)
+        )[0][0]
+
+    def test_tilbagemelding_opdateres_og_avanceres(self):
+        service = FakeXFlowService()
+        outbox = self.opret_outbox(service)
+
+        outbox.tilføj({"ProcesId": 1}, succes=True)
+        outbox.tilføj({"ProcesId": 2}, succes=False)
+        self.assertEqual(self.status(outbox, "1"), AFVENTER)
+
+        self.assertEqual(outbox.behandl_afventende(), 2)
+        self.assertCountEqual(service.opdateret, [("1", True), ("2", False)])
+        self.assertCountEqual(service.avanceret, ["1", "2"])
+        self.assertEqual(outbox.rapport()["antal"], {AFSLUTTET: 2})
+        self.assertEqual(outbox.behandl_afventende(), 0)
+
+    def test_fejlet_avancering_opdaterer_ikke_igen(self):
+        service = FakeXFlowService(avancer_fejl=1)
+        outbox = self.opret_outbox(service)
+
+        outbox.tilføj({"ProcesId": 1}, succes=True)
+        outbox.behandl_afventende()
+        self.assertEqual(self.status(outbox, "1"), OPDATERET)
+
+        # Næste forsøg ligger ude i fremtiden og tages kun med `alle`.
+        self.assertEqual(outbox.behandl_afventende(), 0)
+        outbox.behandl_afventende(alle=True)
+
+        self.assertEqual(self.status(outbox, "1"), AFSLUTTET)
+        self.assertEqual(service.opdateret, [("1", True)])
+        self.assertEqual(service.avanceret, ["1"])
+
+    def test_opgives_efter_maks_forsøg(self):
+        service = FakeXFlowService(opdater_fejl=10)
+        outbox = self.opret_outbox(service, maks_forsøg=3)
+
+        outbox.tilføj({"ProcesId": 1}, succes=True)
+        for _ in range(5):
+            outbox.behandl_afventende(alle=True)
+
+        self.assertEqual(self.status(outbox, "1"), FEJLET)
+        self.assertEqual(service.fejl["opdater"], 7)
+
+        fejlede = outbox.rapport()["fejlede"]
+        self.assertEqual([f["ProcesId"] for f in fejlede], ["1"])
+        self.assertEqual(fejlede[0]["forsøg"], 3)
+        self.assertIn("opdater fejlede", fejlede[0]["fejl"])
+
+    def test_ny_tilbagemelding_nulstiller_tilstanden(self):
+        service = FakeXFlowService(opdater_fejl=10)
+        outbox = self.opret_outbox(service, maks_forsøg=1)
+
+        outbox.tilføj({"ProcesId": 1}, succes=True)
+        outbox.behandl_afventende()
+        self.assertEqual(self.status(outbox, "1"), FEJLET)
+
+        service.fejl["opdater"] = 0
+        outbox.tilføj({"ProcesId": 1}, succes=False)
+        outbox.behandl_afventende()
+
+        self.assertEqual(self.status(outbox, "1"), AFSLUTTET)
+        self.assertEqual(service.opdateret, [("1", False)])
+
+    def test_afventende_overlever_genstart(self):
+        service = FakeXFlowService()
+        outbox = self.opret_outbox(service)
+        outbox.tilføj({"ProcesId": 1}, succes=True)
+
+        genstartet = XFlowOutbox(
+            outbox.sti,
+            hent_xflow_service=lambda: service,
+            hent_process_client=lambda: None,
+        )
+        genstartet.stop()
+
+        self.assertEqual(self.status(genstartet, "1"), AFSLUTTET)
+        self.assertEqual(service.avanceret, ["1"])
+
+    def test_rapport_henter_hverken_service_eller_klient(self):
+        def må_ikke_kaldes():
+            raise AssertionError("XFlow må ikke tilgås")
+
+        mappe = tempfile.TemporaryDirectory()
+        self.addCleanup(mappe.cleanup)
+        outbox = XFlowOutbox(
+            os.path.join(mappe.name, "outbox.sqlite"),
+            hent_xflow_service=må_ikke_kaldes,
+            hent_process_client=må_ikke_kaldes,
+        )
+        outbox.tilføj({"ProcesId": 1}, succes=True)
+
+        self.assertEqual(outbox.rapport()["antal"], {AFVENTER: 1})
+
+    def test_fejl_ved_oprettelse_af_klient_forsøges_igen(self):
+        service = FakeXFlowService()
+        klienter = iter([RuntimeError("token udløbet"), None])
+
+        def hent_process_client():
+            klient = next(klienter)
+            if isinstance(klient, Exception):
+                raise klient
+            return klient
+
+        outbox = self.opret_outbox(service)
+        outbox.hent_process_client = hent_process_client
+        outbox.tilføj({"ProcesId": 1}, succes=True)
+
+        outbox.behandl_afventende()
+        self.assertEqual(self.status(outbox, "1"), AFVENTER)
+        outbox.behandl_afventende(alle=True)
+
+        self.assertEqual(self.status(outbox, "1"), AFSLUTTET)
+
+
+if __name__ == "__main__":
+    unittest.main()
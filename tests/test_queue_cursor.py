@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+import unittest
+
+from datetime import datetime, timedelta
+
+from process.queue_cursor import QueueCursor
+
+VINDUE = timedelta(days=5)
+OVERLAP = timedelta(days=1)
+FULD_INTERVAL = timedelta(hours=24)
+
+
+class QueueCursorTest(unittest.TestCase):
+    def setUp(self):
+        mappe = tempfile.TemporaryDirectory()
+        self.addCleanup(mappe.cleanup)
+        self.sti = os.path.join(mappe.name, "queue_cursor.json")
+
+    def søgevindue(self, cursor: QueueCursor, nu: datetime):
+        return cursor.søgevindue(nu, VINDUE, OVERLAP, FULD_INTERVAL)
+
+    def test_første_kørsel_søger_hele_vinduet(self):
+        cursor = QueueCursor(self.sti, "skabelon")
+
+        self.assertEqual(
+            self.søgevindue(cursor, datetime(2024, 5, 10, 12)),
+            (datetime(2024, 5, 5), True),
+        )
+
+    def test_søger_fra_seneste_kørsel_minus_overlap(self):
+        cursor = QueueCursor(self.sti, "skabelon")
+        cursor.gem(kørt=datetime(2024, 5, 10, 8), glem_før=datetime.min, fuld=True)
+        cursor.gem(kørt=datetime(2024, 5, 10, 12), glem_før=datetime.min)
+
+        self.assertEqual(
+            self.søgevindue(cursor, datetime(2024, 5, 10, 13)),
+            (datetime(2024, 5, 9), False),
+        )
+
+    def test_søger_hele_vinduet_efter_fuld_interval(self):
+        cursor = QueueCursor(self.sti, "skabelon")
+        cursor.gem(kørt=datetime(2024, 5, 10, 8), glem_før=datetime.min, fuld=True)
+        cursor.gem(kørt=datetime(2024, 5, 11, 7), glem_før=datetime.min)
+
+        self.assertEqual(
+            self.søgevindue(cursor, datetime(2024, 5, 11, 8)),
+            (datetime(2024, 5, 6), True),
+        )
+
+    def test_overlap_begrænses_til_vinduet(self):
+        cursor = QueueCursor(self.sti, "skabelon")
+        cursor.gem(kørt=datetime(2024, 5, 10, 12), glem_før=datetime.min, fuld=True)
+
+        søg_fra, fuld = cursor.søgevindue(
+            datetime(2024, 5, 10, 13), VINDUE, timedelta(days=30), FULD_INTERVAL
+        )
+
+        self.assertEqual((søg_fra, fuld), (datetime(2024, 5, 5), True))
+
+    def test_gem_glemmer_gamle_publicids(self):
+        cursor = QueueCursor(self.sti, "skabelon")
+        cursor.marker_set(["1"], tidspunkt=datetime(2024, 5, 1))
+        cursor.marker_set(["2"], tidspunkt=datetime(2024, 5, 8))
+        cursor.gem(kørt=datetime(2024, 5, 10), glem_før=datetime(2024, 5, 5))
+
+        self.assertFalse(cursor.er_set("1"))
+        self.assertTrue(cursor.er_set("2"))
+
+        genindlæst = QueueCursor(self.sti, "skabelon")
+        self.assertFalse(genindlæst.er_set("1"))
+        self.assertTrue(genindlæst.er_set("2"))
+
+    def test_marker_set_beholder_første_tidspunkt(self):
+        cursor = QueueCursor(self.sti, "skabelon")
+        cursor.marker_set(["1"], tidspunkt=datetime(2024, 5, 1))
+        cursor.marker_set(["1"], tidspunkt=datetime(2024, 5, 8))
+        cursor.gem(kørt=datetime(2024, 5, 10), glem_før=datetime(2024, 5, 5))
+
+        self.assertFalse(cursor.er_set("1"))
+
+    def test_tidspunkter_gemmes_pr_skabelon(self):
+        cursor = QueueCursor(self.sti, "a")
+        cursor.gem(kørt=datetime(2024, 5, 10, 8), glem_før=datetime.min, fuld=True)
+        cursor.gem(kørt=datetime(2024, 5, 10, 12), glem_før=datetime.min)
+        QueueCursor(self.sti, "b").gem(kørt=datetime(2024, 5, 9), glem_før=datetime.min)
+
+        genindlæst = QueueCursor(self.sti, "a")
+        self.assertEqual(genindlæst.senest_kørt, datetime(2024, 5, 10, 12))
+        self.assertEqual(genindlæst.senest_fuld, datetime(2024, 5, 10, 8))
+
+        with open(self.sti, encoding="utf-8") as f:
+            self.assertEqual(set(json.load(f)), {"a", "b"})
+
+    def test_nulstil_giver_fuld_søgning(self):
+        cursor = QueueCursor(self.sti, "skabelon")
+        cursor.marker_set(["1"], tidspunkt=datetime(2024, 5, 10))
+        cursor.gem(kørt=datetime(2024, 5, 10, 12), glem_før=datetime.min, fuld=True)
+
+        cursor.nulstil()
+
+        self.assertFalse(cursor.er_set("1"))
+        self.assertEqual(
+            self.søgevindue(cursor, datetime(2024, 5, 10, 13)),
+            (datetime(2024, 5, 5), True),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import threading
+import time
+import unittest
+
+from process.steps import Trin, kør_graf, udelad
+
+
+class KørGrafTest(unittest.TestCase):
+    def test_trin_får_resultater_fra_afhængigheder(self):
+        resultater = kør_graf(
+            [
+                Trin("c", lambda r: r["a"] + r["b"], afhænger_af=("a", "b")),
+                Trin("a", lambda r: 1),
+                Trin("b", lambda r: r["a"] + 1, afhænger_af=("a",)),
+            ]
+        )
+
+        self.assertEqual(resultater, {"a": 1, "b": 2, "c": 3})
+
+    def test_kendte_trin_køres_ikke(self):
+        kørte = []
+
+        def trin(navn, værdi):
+            def funktion(r):
+                kørte.append(navn)
+                return værdi
+
+            return funktion
+
+        resultater = kør_graf(
+            [
+                Trin("a", trin("a", 1)),
+                Trin("b", trin("b", 2), afhænger_af=("a",)),
+            ],
+            kendte={"a": 10},
+        )
+
+        self.assertEqual(kørte, ["b"])
+        self.assertEqual(resultater, {"a": 10, "b": 2})
+
+    def test_uafhængige_trin_kører_samtidigt(self):
+        barriere = threading.Barrier(2, timeout=5)
+
+        kør_graf(
+            [
+                Trin("a", lambda r: barriere.wait()),
+                Trin("b", lambda r: barriere.wait()),
+            ],
+            samtidige=2,
+        )
+
+    def test_fejl_kastes_efter_igangværende_trin_og_stopper_nye(self):
+        afsluttet = threading.Event()
+        kørte = []
+
+        def langsom(r):
+            time.sleep(0.05)
+            afsluttet.set()
+
+        def fejler(r):
+            raise RuntimeError("fejl i trin")
+
+        with self.assertRaisesRegex(RuntimeError, "fejl i trin"):
+            kør_graf(
+                [
+                    Trin("langsom", langsom),
+                    Trin("fejler", fejler),
+                    Trin("efter", lambda r: kørte.append("efter"), ("fejler",)),
+                ],
+                samtidige=2,
+            )
+
+        self.assertTrue(afsluttet.is_set())
+        self.assertEqual(kørte, [])
+
+    def test_første_fejl_vinder(self):
+        def fejler(besked, forsinkelse):
+            def funktion(r):
+                time.sleep(forsinkelse)
+                raise RuntimeError(besked)
+
+            return funktion
+
+        with self.assertRaisesRegex(RuntimeError, "først"):
+            kør_graf(
+                [Trin("a", fejler("først", 0)), Trin("b", fejler("sidst", 0.05))],
+                samtidige=2,
+            )
+
+    def test_stopper_før_nye_trin_når_fortsæt_svarer_nej(self):
+        holder = [True]
+        kørte = []
+
+        def mister(r):
+            kørte.append("a")
+            holder[0] = False
+
+        with self.assertRaises(RuntimeError):
+            kør_graf(
+                [
+                    Trin("a", mister),
+                    Trin("b", lambda r: kørte.append("b"), afhænger_af=("a",)),
+                ],
+                fortsæt=lambda: holder[0],
+            )
+
+        self.assertEqual(kørte, ["a"])
+
+    def test_cyklisk_afhængighed(self):
+        with self.assertRaisesRegex(ValueError, "Cyklisk"):
+            kør_graf(
+                [
+                    Trin("a", lambda r: 1, afhænger_af=("b",)),
+                    Trin("b", lambda r: 2, afhænger_af=("a",)),
+                ]
+            )
+
+    def test_ukendt_afhængighed(self):
+        with self.assertRaisesRegex(ValueError, "ukendt trin 'x'"):
+            kør_graf([Trin("a", lambda r: 1, afhænger_af=("x",))])
+
+
+class UdeladTest(unittest.TestCase):
+    def test_fjerner_trin_og_afhængigheder_af_dem(self):
+        trin = udelad(
+            [
+                Trin("a", lambda r: 1),
+                Trin("b", lambda r: 2, afhænger_af=("a",)),
+                Trin("c", lambda r: 3, afhænger_af=("a", "b")),
+            ],
+            ["b"],
+        )
+
+        self.assertEqual([t.navn for t in trin], ["a", "c"])
+        self.assertEqual(trin[1].afhænger_af, ("a",))
+        self.assertEqual(kør_graf(trin), {"a": 1, "c": 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
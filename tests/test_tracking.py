@@ -0,0 +1,62 @@
+import json
+import os
+import tempfile
+import unittest
+
+from process.tracking import BufferetTracker, HukommelsesTracker
+
+
+class FejlendeTracker:
+    def track_task(self, process_name: str):
+        raise ConnectionError("databasen kan ikke nås")
+
+
+class BufferetTrackerTest(unittest.TestCase):
+    def setUp(self):
+        mappe = tempfile.TemporaryDirectory()
+        self.addCleanup(mappe.cleanup)
+        self.spill_sti = os.path.join(mappe.name, "tracking_spill.json")
+
+    def test_tællinger_skrives_ved_flush(self):
+        tracker = HukommelsesTracker()
+        bufferet = BufferetTracker(tracker, self.spill_sti)
+
+        for _ in range(3):
+            bufferet.track_task("a")
+        bufferet.track_task("b")
+        self.assertEqual(tracker.opgaver, {})
+
+        bufferet.flush()
+        self.assertEqual(tracker.opgaver, {"a": 3, "b": 1})
+        self.assertFalse(os.path.exists(self.spill_sti))
+
+    def test_uskrevne_tællinger_gemmes_og_skrives_ved_næste_start(self):
+        bufferet = BufferetTracker(FejlendeTracker(), self.spill_sti)
+        bufferet.track_task("a")
+        bufferet.track_task("a")
+        bufferet.flush()
+
+        with open(self.spill_sti, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), {"a": 2})
+
+        tracker = HukommelsesTracker()
+        BufferetTracker(tracker, self.spill_sti).flush()
+
+        self.assertEqual(tracker.opgaver, {"a": 2})
+        self.assertFalse(os.path.exists(self.spill_sti))
+
+    def test_baggrundstråd_skriver_ved_maks_antal_og_stop(self):
+        tracker = HukommelsesTracker()
+        bufferet = BufferetTracker(tracker, self.spill_sti, interval=60, maks_antal=2)
+        bufferet.start()
+
+        bufferet.track_task("a")
+        bufferet.track_task("a")
+        bufferet.track_task("b")
+        bufferet.stop()
+
+        self.assertEqual(tracker.opgaver, {"a": 2, "b": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,223 @@
+import unittest
+
+from process.xflow_service import (
+    AKTIVITET,
+    CPR,
+    PERSONOPLYSNINGER,
+    SAMLET_ANSØGNING,
+    XFlowService,
+    indekser_blanketter,
+)
+
+
+class SideProcessClient:
+    """Ufiltreret XFlow-søgning over en fast liste med en given sidestørrelse."""
+
+    def __init__(self, arbejdsgange: list[dict], side_størrelse: int, klem=False):
+        self.arbejdsgange = arbejdsgange
+        self.side_størrelse = side_størrelse
+        self.klem = klem
+        self.kald = 0
+
+    def search_processes(self, query: dict) -> list[dict]:
+        self.kald += 1
+        start = query["startIndex"]
+        if self.klem:
+            # Som en server, der klemmer `startIndex` ind til den sidste side.
+            start = min(start, len(self.arbejdsgange) - self.side_størrelse)
+        return self.arbejdsgange[start : start + self.side_størrelse]
+
+
+def arbejdsgange(antal: int, avancerede: int = 0) -> list[dict]:
+    return [
+        {
+            "publicId": i,
+            AKTIVITET: "Afsluttet" if i < avancerede else "RPAIntegration",
+        }
+        for i in range(antal)
+    ]
+
+
+def søg(klient) -> list[int]:
+    service = XFlowService(None, klient)
+    return [
+        a["publicId"]
+        for side in service.søg_arbejdsgange({"startIndex": 0}, "RPAIntegration")
+        for a in side
+    ]
+
+
+class SøgArbejdsgangeTest(unittest.TestCase):
+    def test_side_uden_relevante_arbejdsgange_stopper_ikke_søgningen(self):
+        klient = SideProcessClient(arbejdsgange(120, avancerede=50), 50)
+
+        self.assertEqual(søg(klient), list(range(50, 120)))
+        self.assertEqual(klient.kald, 3)
+
+    def test_stopper_ved_tom_side(self):
+        klient = SideProcessClient(arbejdsgange(100), 50)
+
+        self.assertEqual(søg(klient), list(range(100)))
+        self.assertEqual(klient.kald, 3)
+
+    def test_stopper_når_startindex_klemmes(self):
+        klient = SideProcessClient(arbejdsgange(100), 30, klem=True)
+
+        self.assertEqual(søg(klient), list(range(100)))
+        self.assertLessEqual(klient.kald, 5)
+
+    def test_stopper_når_startindex_ignoreres(self):
+        klient = SideProcessClient(arbejdsgange(100), 30)
+        klient.search_processes = lambda query: klient.arbejdsgange[:30]
+
+        self.assertEqual(søg(klient), list(range(30)))
+
+    def test_mangler_aktivitetsfeltet(self):
+        klient = SideProcessClient([{"publicId": 1}], 50)
+
+        with self.assertRaises(ValueError):
+            søg(klient)
+
+
+class FakeXFlowClient:
+    def is_non_empty(self, værdi) -> bool:
+        return bool(værdi)
+
+
+def gruppe(identifier: str, *gentagelser: list[dict]) -> dict:
+    return {"identifier": identifier, "children": [list(g) for g in gentagelser]}
+
+
+def upload(identifier: str, *dokument_ids: str) -> dict:
+    return {
+        "identifier": identifier,
+        "values": {f"document{i + 1}": d for i, d in enumerate(dokument_ids)},
+    }
+
+
+def arbejdsgang(ansøgning: list[dict], personoplysninger: list[dict]) -> dict:
+    blanketter = []
+    if ansøgning is not None:
+        blanketter.append({"blanketnavn": SAMLET_ANSØGNING, "elementer": ansøgning})
+    if personoplysninger is not None:
+        blanketter.append(
+            {"blanketnavn": PERSONOPLYSNINGER, "elementer": personoplysninger}
+        )
+    return {"publicId": 744, "blanketter": blanketter}
+
+
+def person(identifier: str, cpr: str) -> dict:
+    return {"identifier": identifier, "values": {"CprNummer": cpr}}
+
+
+STANDARD_ANSØGNING = [
+    {
+        "identifier": "ElementVaerdilisteTypeHjaelpemiddel",
+        "values": {"Valgtetekst": "Paryk"},
+    },
+    {"identifier": "HarDuTidligereSoegt", "values": {"YesSelected": "True"}},
+]
+STANDARD_PERSON = [person("PersonoplysningerAnsoegerSelv", "010101-1234")]
+
+
+class HentDataudtrækTest(unittest.TestCase):
+    def udtræk(self, ansøgning=STANDARD_ANSØGNING, personoplysninger=STANDARD_PERSON):
+        service = XFlowService(FakeXFlowClient(), None)
+        return service.hent_dataudtræk_til_kødata(
+            arbejdsgang(ansøgning, personoplysninger)
+        )
+
+    def test_kødata(self):
+        self.assertEqual(
+            self.udtræk(),
+            {
+                "Cpr": "010101-1234",
+                "Genansøgning": True,
+                "Hjælpemiddel": "Paryk",
+                "DokumentIds": [],
+                "ProcesId": 744,
+            },
+        )
+
+    def test_cpr_fra_første_blok_i_dokumentrækkefølge(self):
+        for blokke, forventet in (
+            (
+                [
+                    person("PersonoplysningerAnsoegerSelv", "010101-1234"),
+                    person("PersonoplysningerAnsoegerVedAndenPart", ""),
+                ],
+                "010101-1234",
+            ),
+            (
+                [
+                    {
+                        "identifier": "Skjult",
+                        "children": [
+                            [
+                                person(
+                                    "PersonoplysningerAnsoegerVedAndenPart",
+                                    "020202-2345",
+                                )
+                            ]
+                        ],
+                    },
+                    person("PersonoplysningerAnsoegerSelv", "010101-1234"),
+                ],
+                "020202-2345",
+            ),
+        ):
+            with self.subTest(forventet=forventet):
+                self.assertEqual(
+                    CPR.værdi(
+                        indekser_blanketter(arbejdsgang([], blokke)["blanketter"])
+                    ),
+                    forventet,
+                )
+                self.assertEqual(
+                    self.udtræk(personoplysninger=blokke)["Cpr"], forventet
+                )
+
+    def test_manglende_blanket(self):
+        self.assertIsNone(self.udtræk(ansøgning=None))
+        self.assertIsNone(self.udtræk(personoplysninger=None))
+
+    def test_dokumenter_fra_første_gentagelse_af_gruppen(self):
+        kødata = self.udtræk(
+            ansøgning=STANDARD_ANSØGNING
+            + [
+                upload("UploadBilag", "uden-for-gruppen"),
+                gruppe(
+                    "BemærkningerOgVedhaeftFiler",
+                    [upload("UploadBilag", "a", "", "b")],
+                    [upload("UploadBilag", "c")],
+                ),
+            ],
+            personoplysninger=STANDARD_PERSON
+            + [gruppe("Dokumentation", [upload("UploadDokumentationVaerge", "d")])],
+        )
+
+        self.assertEqual(kødata["DokumentIds"], ["a", "b", "d"])
+
+    def test_ingen_dokumenter_når_første_gentagelse_er_tom(self):
+        kødata = self.udtræk(
+            ansøgning=STANDARD_ANSØGNING
+            + [
+                gruppe(
+                    "BemærkningerOgVedhaeftFiler",
+                    [],
+                    [upload("UploadBilag", "c")],
+                )
+            ]
+        )
+
+        self.assertEqual(kødata["DokumentIds"], [])
+
+    def test_manglende_genansøgning_er_false(self):
+        kødata = self.udtræk(ansøgning=STANDARD_ANSØGNING[:1])
+
+        self.assertIs(kødata["Genansøgning"], False)
+        self.assertEqual(kødata["Hjælpemiddel"], "Paryk")
+
+
+if __name__ == "__main__":
+    unittest.main()